@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# File:             	Archive.py
+# Date:             	20/09/2021
+# Author:          	Marc Rocca
+# Modifications:    	Null
+
+"""
+Archives every genome evaluated during training in a columnar, chunked format
+on disk so that it can be filtered and reloaded without re-running the races.
+"""
+
+import os
+import sys
+import glob
+import neat
+import numpy as np
+
+ROW_COLUMNS = ['id', 'generation', 'species', 'fitness', 'episode_length']
+
+class GenomeArchive(neat.reporting.BaseReporter):
+	"""
+	NEAT reporter that stores the id, generation, species, fitness, episode
+	length and network of each evaluated genome. Rows are buffered in memory
+	and written as a new .npz chunk of column arrays every chunk_size rows.
+	"""
+
+	def __init__(self, directory, chunk_size=1000):
+		"""
+		@param string directory: Directory the chunk files are written to
+		@param int chunk_size: Rows buffered before a chunk is written
+		"""
+		self.directory = directory
+		self.chunk_size = chunk_size
+		self.rows = []
+		self.generation = None
+		os.makedirs(directory, exist_ok=True)
+		self.chunks = list_chunks(directory)
+
+	def start_generation(self, generation):
+		"""
+		Removes chunks written after this archive's state was saved, which are
+		written again when a run is resumed from a checkpoint
+		"""
+		self.generation = generation
+		for chunk in list_chunks(self.directory):
+			if chunk not in self.chunks: os.remove(chunk)
+
+	def post_evaluate(self, config, population, species, best_genome):
+		for gid, genome in population.items():
+			self.rows.append(encode_genome(genome, self.generation,
+				species.genome_to_species.get(gid, -1)))
+		if len(self.rows) >= self.chunk_size: self.flush()
+
+	def found_solution(self, config, generation, best):
+		self.flush()
+
+	def flush(self):
+		"""
+		Writes the buffered rows to a new chunk file
+		"""
+		if len(self.rows) == 0: return
+		generations = [row[1] for row in self.rows]
+		filename = os.path.join(self.directory,
+			f"chunk-{min(generations):06d}-{max(generations):06d}-{len(self.chunks):05d}.npz")
+		with open(filename + '.tmp', 'wb') as f:
+			np.savez(f, **encode_chunk(self.rows))
+		os.replace(filename + '.tmp', filename)
+		self.chunks.append(filename)
+		self.rows = []
+
+	def scan(self, columns=ROW_COLUMNS, generations=None):
+		"""
+		Returns the requested columns of every archived genome
+		@param list columns: Names of the columns to read
+		@param tuple generations: Only include rows in (first, last) generation
+		@return dict: Numpy array for each column
+		"""
+		parts = [{c: encode_chunk([])[c] for c in columns}]
+		for chunk in self.chunks_in(generations):
+			with np.load(chunk) as data:
+				mask = generation_mask(data['generation'], generations)
+				parts.append({c: data[c][mask] for c in columns})
+		if len(self.rows):
+			data = encode_chunk(self.rows)
+			mask = generation_mask(data['generation'], generations)
+			parts.append({c: data[c][mask] for c in columns})
+		return {c: np.concatenate([p[c] for p in parts]) for c in columns}
+
+	def top(self, n, generations=None):
+		"""
+		Returns the rows of the n fittest genomes, fittest first
+		@param tuple generations: Only include rows in (first, last) generation
+		"""
+		rows = self.scan(generations=generations)
+		order = np.argsort(-rows['fitness'], kind='stable')[:n]
+		return {c: v[order] for c, v in rows.items()}
+
+	def load_genomes(self, config, ids, generations=None):
+		"""
+		Rebuilds archived genomes, with their archived fitness, without re-racing them
+		@param list ids: Genome ids to load
+		@param tuple generations: Only search rows in (first, last) generation
+		@return dict: Genome for each id found, from the latest generation archived
+		"""
+		genomes = {}
+		for chunk in self.chunks_in(generations):
+			with np.load(chunk) as data:
+				genomes.update(decode_rows(data, ids, generations, config))
+		if len(self.rows):
+			genomes.update(decode_rows(encode_chunk(self.rows), ids, generations, config))
+		return genomes
+
+	def chunks_in(self, generations):
+		"""
+		Returns the chunk files that may hold rows in the generation range
+		"""
+		if generations == None: return list(self.chunks)
+		first, last = generations
+		chunks = []
+		for chunk in self.chunks:
+			_, start, end, _ = os.path.basename(chunk)[:-4].split('-')
+			if int(end) >= first and int(start) <= last: chunks.append(chunk)
+		return chunks
+
+
+def latest_run(directory):
+	"""
+	Returns the most recent run directory inside the archive directory, or the
+	directory itself if it holds chunks or no runs
+	"""
+	runs = sorted([d for d in glob.glob(os.path.join(directory, '*')) if os.path.isdir(d)])
+	if len(list_chunks(directory)) or len(runs) == 0: return directory
+	return runs[-1]
+
+def list_chunks(directory):
+	"""
+	Returns the chunk files in the directory in the order they were written
+	"""
+	chunks = glob.glob(os.path.join(directory, 'chunk-*.npz'))
+	return sorted(chunks, key=lambda c: int(os.path.basename(c)[:-4].split('-')[-1]))
+
+def generation_mask(generation, generations):
+	"""
+	Returns a boolean array of the rows inside the (first, last) generation range
+	"""
+	if generations == None: return np.ones(len(generation), dtype=bool)
+	return (generation >= generations[0]) & (generation <= generations[1])
+
+def encode_genome(genome, generation, species):
+	"""
+	Flattens a genome into a row of its columns and its network genes
+	"""
+	nodes = [(k, n.bias, n.response, n.activation, n.aggregation) for k, n in genome.nodes.items()]
+	conns = [(k[0], k[1], c.weight, c.enabled) for k, c in genome.connections.items()]
+	return (genome.key, generation, species, genome.fitness,
+		getattr(genome, 'episode_length', 0), nodes, conns)
+
+def encode_chunk(rows):
+	"""
+	Packs encoded genome rows into column arrays. The variable sized node and
+	connection genes of all rows are concatenated and indexed by offsets.
+	"""
+	ids, generations, species, fitness, lengths, nodes, conns = zip(*rows) if rows else [()]*7
+	all_nodes = [n for row in nodes for n in row]
+	all_conns = [c for row in conns for c in row]
+	functions = sorted(set([n[3] for n in all_nodes] + [n[4] for n in all_nodes]))
+	return {
+		'id': np.array(ids, dtype=np.int64),
+		'generation': np.array(generations, dtype=np.int32),
+		'species': np.array(species, dtype=np.int32),
+		'fitness': np.array([f if f != None else np.nan for f in fitness], dtype=np.float64),
+		'episode_length': np.array(lengths, dtype=np.int32),
+		'node_offset': np.cumsum([0] + [len(n) for n in nodes]).astype(np.int64),
+		'node_key': np.array([n[0] for n in all_nodes], dtype=np.int32),
+		'node_bias': np.array([n[1] for n in all_nodes], dtype=np.float64),
+		'node_response': np.array([n[2] for n in all_nodes], dtype=np.float64),
+		'node_activation': np.array([functions.index(n[3]) for n in all_nodes], dtype=np.uint8),
+		'node_aggregation': np.array([functions.index(n[4]) for n in all_nodes], dtype=np.uint8),
+		'conn_offset': np.cumsum([0] + [len(c) for c in conns]).astype(np.int64),
+		'conn_in': np.array([c[0] for c in all_conns], dtype=np.int32),
+		'conn_out': np.array([c[1] for c in all_conns], dtype=np.int32),
+		'conn_weight': np.array([c[2] for c in all_conns], dtype=np.float64),
+		'conn_enabled': np.array([c[3] for c in all_conns], dtype=bool),
+		'functions': np.array(functions, dtype=str)}
+
+def decode_rows(data, ids, generations, config):
+	"""
+	Rebuilds the genomes of a chunk whose id is in ids
+	"""
+	mask = generation_mask(data['generation'], generations) & np.isin(data['id'], list(ids))
+	return {int(data['id'][row]): decode_genome(data, row, config) for row in np.nonzero(mask)[0]}
+
+def decode_genome(data, row, config):
+	"""
+	Rebuilds the genome stored in the row of a chunk
+	"""
+	gc = config.genome_config
+	genome = config.genome_type(int(data['id'][row]))
+	genome.fitness = float(data['fitness'][row])
+	genome.episode_length = int(data['episode_length'][row])
+	functions = data['functions']
+	start, end = data['node_offset'][row], data['node_offset'][row+1]
+	for i in range(start, end):
+		node = gc.node_gene_type(int(data['node_key'][i]))
+		node.bias = float(data['node_bias'][i])
+		node.response = float(data['node_response'][i])
+		node.activation = str(functions[data['node_activation'][i]])
+		node.aggregation = str(functions[data['node_aggregation'][i]])
+		genome.nodes[node.key] = node
+	start, end = data['conn_offset'][row], data['conn_offset'][row+1]
+	for i in range(start, end):
+		conn = gc.connection_gene_type((int(data['conn_in'][i]), int(data['conn_out'][i])))
+		conn.weight = float(data['conn_weight'][i])
+		conn.enabled = bool(data['conn_enabled'][i])
+		genome.connections[conn.key] = conn
+	return genome
+
+
+if __name__ == '__main__':
+
+	if len(sys.argv) < 2:
+		print("Usage: python3 Archive.py <directory> [n] [first_gen] [last_gen]")
+	else:
+		directory = latest_run(sys.argv[1])
+		print(f"Genomes archived in {directory}")
+		archive = GenomeArchive(directory)
+		n = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+		generations = None
+		if len(sys.argv) > 4: generations = (int(sys.argv[3]), int(sys.argv[4]))
+		rows = archive.top(n, generations)
+		print(f"{'id':>8} {'generation':>10} {'species':>8} {'fitness':>10} {'ep len':>8}")
+		for i in range(len(rows['id'])):
+			print(f"{rows['id'][i]:>8} {rows['generation'][i]:>10} {rows['species'][i]:>8} "
+				f"{rows['fitness'][i]:>10.2f} {rows['episode_length'][i]:>8}")
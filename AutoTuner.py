@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# File:             	AutoTuner.py
+# Date:             	20/09/2021
+# Author:          	Marc Rocca
+# Modifications:    	Null
+
+"""
+Tunes the size of each training generation to how fast the machine can
+simulate, instead of relying on hand picked constants.
+"""
+
+import time
+import neat
+import tracemalloc
+
+class AutoTuner(neat.reporting.BaseReporter):
+	"""
+	NEAT reporter that measures the simulation steps per second of each
+	generation and adjusts the worker count, population size and episode frame
+	budget, within their bounds, so generations take about the target time
+	"""
+
+	def __init__(self, target_time=None, time_budget=None, generations=None,
+		pop_size=(20, 200), frames_per_checkpoint=(100, 300), workers=(1, 1),
+		curriculum=None, warmup=2, tolerance=0.2):
+		"""
+		@param float target_time: Seconds each generation should be evaluated in
+		@param float time_budget: Seconds for the whole run, used instead of target_time
+		@param int generations: Generations in the whole run, needed with time_budget
+		@param tuple pop_size: (min, max) population size
+		@param tuple frames_per_checkpoint: (min, max) frames per checkpoint of the curriculum
+		@param tuple workers: (min, max) number of worker processes
+		@param Curriculum curriculum: Curriculum whose frame budget is tuned
+		@param int warmup: Generations measured before the first adjustment
+		@param float tolerance: Fraction either side of the target that is left alone
+		"""
+		self.target_time = target_time
+		self.time_budget = time_budget
+		self.generations = generations
+		self.pop_size_bounds = pop_size
+		self.frames_bounds = frames_per_checkpoint
+		self.workers_bounds = workers
+		self.workers = workers[0]
+		self.curriculum = curriculum
+		self.warmup = warmup
+		self.tolerance = tolerance
+		self.generation = None
+		self.start_time = None
+		self.elapsed = 0			# Seconds spent evaluating so far
+		self.measured = 0			# Generations measured
+		self.steps_per_sec = None	# Smoothed simulation steps per second
+		self.decisions = []			# Adjustments made in the latest generation
+		self.rate_before_worker = None	# Steps per second before the last worker was added
+
+	def start_generation(self, generation):
+		self.generation = generation
+		self.start_time = time.time()
+		self.decisions = []
+
+	def post_evaluate(self, config, population, species, best_genome):
+		"""
+		Measures the generation just evaluated and adjusts the settings used by the next
+		"""
+		eval_time = time.time() - self.start_time
+		self.elapsed += eval_time
+
+		# Generations traced by the memory profiler run many times slower than usual
+		if tracemalloc.is_tracing(): return
+		self.measured += 1
+		frames = sum([getattr(g, 'frames_simulated', 0) for g in population.values()])
+		rate = frames/eval_time if eval_time > 0 else 0
+		if self.steps_per_sec == None: self.steps_per_sec = rate
+		else: self.steps_per_sec = 0.5*self.steps_per_sec + 0.5*rate
+
+		# Keep an added worker only if it made the simulation faster
+		if self.rate_before_worker != None:
+			if rate < 1.1*self.rate_before_worker:
+				reason = f"{rate:.0f} steps/s with {self.workers} workers, {self.rate_before_worker:.0f} before"
+				self.workers_bounds = (self.workers_bounds[0], self.workers - 1)
+				self.set('workers', self.workers - 1, reason)
+			self.rate_before_worker = None
+			return
+
+		target = self.get_target()
+		if self.measured < self.warmup or target == None or eval_time == 0: return
+		ratio = target / eval_time
+		if abs(ratio - 1) <= self.tolerance: return
+		ratio = min(max(ratio, 0.5), 2) ** 0.5 	# Only move part of the way as episodes vary
+		reason = f"evaluated in {eval_time:.1f}s, target {target:.1f}s, {self.steps_per_sec:.0f} steps/s"
+
+		# Too slow: add workers, then shrink the population, then the frame budget
+		if ratio < 1:
+			if self.workers < self.workers_bounds[1]:
+				self.rate_before_worker = rate
+				self.set('workers', self.workers + 1, reason)
+			elif config.pop_size > self.pop_size_bounds[0]:
+				self.set_pop_size(config, config.pop_size*ratio, reason)
+			elif self.curriculum != None:
+				self.set_frames(self.curriculum.frames_per_checkpoint*ratio, reason)
+
+		# Too fast: grow the frame budget back, then the population
+		else:
+			if self.curriculum != None and self.curriculum.frames_per_checkpoint < self.frames_bounds[1]:
+				self.set_frames(self.curriculum.frames_per_checkpoint*ratio, reason)
+			elif config.pop_size < self.pop_size_bounds[1]:
+				self.set_pop_size(config, config.pop_size*ratio, reason)
+
+	def get_target(self):
+		"""
+		Returns the seconds the next generation should take or None
+		"""
+		if self.time_budget != None and self.generations != None:
+			remaining = max(self.generations - self.generation - 1, 1)
+			return max(self.time_budget - self.elapsed, 0) / remaining
+		return self.target_time
+
+	def set_pop_size(self, config, pop_size, reason):
+		low, high = self.pop_size_bounds
+		self.set('pop_size', int(min(max(pop_size, low), high)), reason, config)
+
+	def set_frames(self, frames, reason):
+		low, high = self.frames_bounds
+		self.set('frames_per_checkpoint', int(min(max(frames, low), high)), reason, self.curriculum)
+
+	def set(self, name, value, reason, target=None):
+		"""
+		Sets the setting on the target object and logs the decision
+		"""
+		target = target or self
+		old = getattr(target, name)
+		if old == value: return
+		setattr(target, name, value)
+		self.decisions.append({'setting': name, 'old': old, 'new': value, 'reason': reason})
+		print(f" Auto-tune: {name} {old} -> {value} ({reason})")
+
+	def report(self):
+		"""
+		Returns the measured throughput, current settings and latest decisions
+		"""
+		report = {'steps_per_sec': self.steps_per_sec, 'workers': self.workers,
+			'decisions': self.decisions}
+		if self.curriculum != None:
+			report['frames_per_checkpoint'] = self.curriculum.frames_per_checkpoint
+		return report
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# File:             	Checkpoint.py
+# Date:             	20/09/2021
+# Author:          	Marc Rocca
+# Modifications:    	Null
+
+"""
+Periodically saves the whole training state so that a crashed or preempted
+training run can be resumed from where it stopped.
+"""
+
+import os
+import glob
+import gzip
+import time
+import neat
+import pickle
+import random
+import numpy as np
+
+class TrainingCheckpointer(neat.reporting.BaseReporter):
+	"""
+	NEAT reporter that pickles the population, its reporters, the random number
+	generator states and any extra training state at the start of a generation
+	"""
+
+	def __init__(self, population, filename_prefix='checkpoint-', generation_interval=10,
+		time_interval=600, keep=3, state=None):
+		"""
+		@param neat.Population population: Population being trained
+		@param string filename_prefix: Checkpoints are saved as prefix + generation
+		@param int generation_interval: Max generations between checkpoints
+		@param float time_interval: Max seconds between checkpoints
+		@param int keep: Number of the checkpoints saved by this run that are kept on disk
+		@param dict state: Extra objects to save, such as caches used by training
+		"""
+		self.population = population
+		self.filename_prefix = filename_prefix
+		self.generation_interval = generation_interval
+		self.time_interval = time_interval
+		self.keep = keep
+		self.state = state or {}
+		self.last_generation = population.generation
+		self.last_time = time.time()
+		self.saved = []		# Checkpoint files saved by this run, oldest first
+
+	def start_generation(self, generation):
+		"""
+		Saves a checkpoint of the generation about to be evaluated when one is due
+		"""
+		if generation == self.last_generation: return
+		if (generation - self.last_generation >= self.generation_interval or
+			time.time() - self.last_time >= self.time_interval):
+			self.save_checkpoint(generation)
+
+	def save_checkpoint(self, generation):
+		"""
+		Saves the current training state. The file is written under a temporary
+		name first so an interrupted save never replaces a good checkpoint.
+		"""
+		self.last_generation = generation
+		self.last_time = time.time()
+		filename = f"{self.filename_prefix}{generation}"
+		self.saved.append(filename)
+		data = {
+			'population': self.population,
+			'random': random.getstate(),
+			'numpy_random': np.random.get_state(),
+			'state': self.state}
+		with gzip.open(filename + '.tmp', 'wb', compresslevel=5) as f:
+			pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+		os.replace(filename + '.tmp', filename)
+		print(f"Saving checkpoint to {filename}")
+
+		# Only remove checkpoints this run saved, never those of another run
+		for old in self.saved[:-self.keep]:
+			if os.path.exists(old): os.remove(old)
+		self.saved = self.saved[-self.keep:]
+
+	def remove_checkpoints(self):
+		"""
+		Removes the checkpoints saved by this run once it has finished, so that
+		it is neither resumed nor blocks a new run
+		"""
+		for filename in self.saved:
+			if os.path.exists(filename): os.remove(filename)
+		self.saved = []
+
+
+def list_checkpoints(filename_prefix):
+	"""
+	Returns the checkpoint files with the prefix, ordered by generation
+	"""
+	checkpoints = []
+	for filename in glob.glob(filename_prefix + '*'):
+		suffix = filename[len(filename_prefix):]
+		if suffix.isdigit(): checkpoints.append((int(suffix), filename))
+	return [filename for generation, filename in sorted(checkpoints)]
+
+def latest_checkpoint(filename_prefix):
+	"""
+	Returns the most recent checkpoint file with the prefix or None
+	"""
+	checkpoints = list_checkpoints(filename_prefix)
+	if len(checkpoints) == 0: return None
+	return checkpoints[-1]
+
+def restore_checkpoint(filename):
+	"""
+	Restores the random number generators and returns the saved training state
+	@return neat.Population: Population with its reporters, ready to run
+	@return dict: The extra state saved with the checkpoint
+	"""
+	with gzip.open(filename) as f:
+		data = pickle.load(f)
+	random.setstate(data['random'])
+	np.random.set_state(data['numpy_random'])
+	return data['population'], data['state']
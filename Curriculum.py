@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# File:             	Curriculum.py
+# Date:             	20/09/2021
+# Author:          	Marc Rocca
+# Modifications:    	Null
+
+"""
+Schedules how long each training episode may run for so that early generations
+of random genomes are only simulated for a short section of the track.
+"""
+
+class Curriculum():
+	"""
+	Grows the number of checkpoints and frames an episode is allowed once
+	enough of the population has reached the end of the current budget
+	"""
+
+	def __init__(self, start_checkpoints=2, step=2, fraction=0.2, frames_per_checkpoint=150):
+		"""
+		@param int start_checkpoints: Checkpoints allowed in the first generation
+		@param int step: Checkpoints added each time the budget grows
+		@param float fraction: Fraction of cars that must reach the budget for it to grow
+		@param int frames_per_checkpoint: Frames allowed for each checkpoint in the budget
+		"""
+		self.checkpoints = start_checkpoints
+		self.step = step
+		self.fraction = fraction
+		self.frames_per_checkpoint = frames_per_checkpoint
+		self.last_budget = self.budget()
+		self.reached = 0
+
+	def budget(self):
+		"""
+		Returns the (checkpoints, frames) an episode may run for
+		"""
+		return self.checkpoints, self.checkpoints*self.frames_per_checkpoint
+
+	def update(self, progress):
+		"""
+		Grows the budget if enough cars reached it in the last generation
+		@param list progress: Checkpoints passed by each car
+		"""
+		self.last_budget = self.budget()
+		self.reached = sum([p >= self.checkpoints for p in progress]) / len(progress)
+		if self.reached >= self.fraction:
+			self.checkpoints += self.step
+
+	def report(self):
+		"""
+		Returns the budget of the last generation and the fraction of cars that reached it
+		"""
+		checkpoints, frames = self.last_budget
+		return {'checkpoints': checkpoints, 'frames': frames, 'reached': self.reached}
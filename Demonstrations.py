@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# File:             	Demonstrations.py
+# Date:             	20/09/2021
+# Author:          	Marc Rocca
+# Modifications:    	Null
+
+"""
+Records how a human drives and fits networks to the recordings so that the
+first NEAT generation can start from drivers that already follow the road.
+"""
+
+import os
+import sys
+import glob
+import time
+import neat
+import numpy as np
+from Game import LidarSensor
+
+INPUT_SCALE = 250	# Longest lidar distance, inputs are divided by it while fitting
+ACTIVATION_GAIN = 2.5	# neat's tanh activation is tanh(2.5*z)
+POLICY_TOLERANCE = 1e-3	# Largest difference allowed between the seeded networks and the fit
+
+class DrivingRecorder():
+	"""
+	Records the lidar readings of a car together with the steering and throttle
+	it is driven with, once per frame
+	"""
+
+	def __init__(self, car, walls, lidar_mode='full'):
+		"""
+		@param Car() car: The car being driven
+		@param walls: Dict of Line()'s, or their Segments(), the lidar detects
+		@param string lidar_mode: LidarSensor() mode, the same as the trained cars
+		"""
+		self.car = car
+		self.lidar = LidarSensor(walls, mode=lidar_mode)
+		self.lidar_rows, self.steering, self.throttle, self.on_road = [], [], [], []
+
+	def record(self):
+		"""
+		Records the lidar readings and the inputs about to be applied this frame
+		"""
+		self.lidar_rows.append(self.lidar.get_lidar_distances(self.car.rect.center, self.car.heading))
+		linear, rotation = self.car.process_inputs()
+		self.steering.append(rotation)
+		self.throttle.append(linear)
+		insideOuterWall = self.lidar.obstacles['OuterWall'].inside_polygon(self.car.rect.center)
+		insideInnerWall = self.lidar.obstacles['InnerWall'].inside_polygon(self.car.rect.center)
+		self.on_road.append(insideOuterWall != insideInnerWall)
+
+	def save(self, directory):
+		"""
+		Saves the recording as a new file in the directory
+		@return string: Filename of the recording, or None if nothing was recorded
+		"""
+		if len(self.lidar_rows) == 0: return None
+		os.makedirs(directory, exist_ok=True)
+		filename = os.path.join(directory, f"drive-{time.strftime('%Y%m%d-%H%M%S')}.npz")
+		np.savez_compressed(filename,
+			lidar=np.array(self.lidar_rows, dtype=np.uint8),
+			steering=np.array(self.steering, dtype=np.int8),
+			throttle=np.array(self.throttle, dtype=np.float16),
+			on_road=np.array(self.on_road, dtype=bool))
+		return filename
+
+
+def load_demonstrations(directory):
+	"""
+	Returns the lidar readings and target network outputs of every on road
+	frame recorded in the directory
+	@return array: (frames, lidar lines) lidar readings
+	@return array: (frames, 3) network outputs that drive the car as recorded
+	"""
+	inputs, targets = [], []
+	for filename in sorted(glob.glob(os.path.join(directory, 'drive-*.npz'))):
+		with np.load(filename) as data:
+			mask = data['on_road']
+			inputs.append(data['lidar'][mask].astype(np.float64))
+			targets.append(action_targets(data['steering'][mask], data['throttle'][mask]))
+	if len(inputs) == 0: return np.zeros((0, 0)), np.zeros((0, 3))
+	return np.concatenate(inputs), np.concatenate(targets)
+
+def action_targets(steering, throttle):
+	"""
+	Converts recorded inputs into the outputs of a network that gives the same
+	inputs through Car_AI.set_input. Outputs 0 and 1 steer left and right and
+	output 2 is full throttle.
+	"""
+	steering = np.asarray(steering, dtype=np.float64)
+	throttle = np.asarray(throttle, dtype=np.float64)
+	return np.stack([np.maximum(-steering, 0), np.maximum(steering, 0),
+		(throttle <= -1).astype(np.float64)], axis=1)
+
+def fit_policy(inputs, targets, steps=2000, rate=0.5, ridge=1e-3):
+	"""
+	Fits a network with each lidar input connected to each tanh output. The
+	weights start from a least squares fit of the outputs' inverse and are
+	refined by gradient descent on the squared error of the outputs.
+	@return array: (inputs, outputs) weights, for inputs divided by INPUT_SCALE
+	@return array: (outputs) biases
+	"""
+	x = np.hstack([inputs/INPUT_SCALE, np.ones((len(inputs), 1))])
+	z = np.arctanh(np.clip(targets, -0.9, 0.9))
+	w = np.linalg.solve(x.T @ x + ridge*np.eye(x.shape[1]), x.T @ z)
+	for step in range(steps):
+		out = np.tanh(x @ w)
+		w -= rate * x.T @ ((out - targets)*(1 - out*out)) / len(x)
+	return w[:-1], w[-1]
+
+def policy_accuracy(inputs, targets, weights, biases):
+	"""
+	Returns the fraction of frames where the fitted network steers the same
+	way as the recording
+	"""
+	out = np.tanh(inputs/INPUT_SCALE @ weights + biases)
+	steering = np.round(-out[:,0] + out[:,1])
+	return float(np.mean(steering == -targets[:,0] + targets[:,1])) if len(out) else 0.0
+
+def policy_genome(key, config, weights, biases):
+	"""
+	Creates a genome whose lidar inputs connect straight to its outputs with
+	the fitted weights, divided by ACTIVATION_GAIN so that the network's tanh
+	gives the fitted outputs
+	"""
+	gc = config.genome_config
+	genome = config.genome_type(key)
+	for j, output in enumerate(gc.output_keys):
+		node = genome.create_node(gc, output)
+		node.bias = float(np.clip(biases[j]/ACTIVATION_GAIN, gc.bias_min_value, gc.bias_max_value))
+		node.response = 1.0
+		genome.nodes[output] = node
+		for i, input in enumerate(gc.input_keys):
+			conn = genome.create_connection(gc, input, output)
+			conn.weight = float(np.clip(weights[i, j]/(INPUT_SCALE*ACTIVATION_GAIN), gc.weight_min_value, gc.weight_max_value))
+			conn.enabled = True
+			genome.connections[conn.key] = conn
+	return genome
+
+def policy_error(config, inputs, weights, biases, frames=500):
+	"""
+	Returns the largest difference between the outputs of a network built from
+	the fitted genome and the fit itself, over the first frames of the inputs
+	"""
+	if len(inputs) == 0: return 0.0
+	net = neat.nn.FeedForwardNetwork.create(policy_genome(0, config, weights, biases), config)
+	expected = np.tanh(inputs[:frames]/INPUT_SCALE @ weights + biases)
+	actual = np.array([net.activate(row) for row in inputs[:frames]])
+	return float(np.max(np.abs(actual - expected)))
+
+def seed_population(population, config, weights, biases, fraction=0.5, noise=0.2):
+	"""
+	Replaces a fraction of a new population with genomes of the fitted network.
+	The first keeps the fitted weights and the rest have noise added for variety.
+	@param neat.Population population: Population that has not been run yet
+	@param float noise: Stdev of the noise added to the weights and biases
+	"""
+	keys = list(population.population)[:int(fraction*len(population.population))]
+	for n, key in enumerate(keys):
+		scale = noise if n else 0
+		population.population[key] = policy_genome(key, config,
+			weights + np.random.normal(0, scale, weights.shape),
+			biases + np.random.normal(0, scale, biases.shape))
+	population.species = config.species_set_type(config.species_set_config, population.reporters)
+	population.species.speciate(config, population.population, population.generation)
+	return len(keys)
+
+
+if __name__ == '__main__':
+
+	if len(sys.argv) < 2:
+		print("Usage: python3 Demonstrations.py <directory> [config]")
+	else:
+		inputs, targets = load_demonstrations(sys.argv[1])
+		print(f"Loaded {len(inputs)} on road frames")
+		if len(inputs):
+			weights, biases = fit_policy(inputs, targets)
+			print(f"Steering matches the recordings on "
+				f"{100*policy_accuracy(inputs, targets, weights, biases):.1f}% of frames")
+			config = neat.config.Config(neat.DefaultGenome, neat.DefaultReproduction,
+				neat.DefaultSpeciesSet, neat.DefaultStagnation, sys.argv[2] if len(sys.argv) > 2 else './config')
+			error = policy_error(config, inputs, weights, biases)
+			print(f"Seeded networks differ from the fit by up to {error:.2g}")
+			if error > POLICY_TOLERANCE: print("Warning: seeded networks do not match the fit")
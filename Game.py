@@ -26,7 +26,6 @@ W_HEIGHT = 800
 CAR_WIDTH = 32
 MAP_WIDTH = 2500
 MAP_HEIGHT = 2500
-NUM_CHECKPOINTS = 4
 COLORS = ['blue','green','yellow','black']
 
 class Game():
@@ -34,13 +33,19 @@ class Game():
 	Class containing the game and the current game state
 	"""
 		
-	def __init__(self, train=False, lidar=False, AI=True, Human=True):
+	def __init__(self, train=False, lidar=False, AI=True, Human=True, map_path=None,
+		car_collisions=True, lidar_mode='full', simplify=0):
 		"""
 		Game Initalisation
 		@param bool train: If the Game is being used for training the model
 		@param bool lidar: Whether the game should display the lidar readings
 		@param bool AI: Whether AI cars are to be included
 		@param bool Human: Whether Human cars are to be included
+		@param string map_path: .tmx track to load instead of the default map
+		@param bool car_collisions: Whether cars collide with each other
+		@param string lidar_mode: LidarSensor() mode of the AI cars
+		@param float simplify: Tolerance (pixels) for removing near collinear wall
+			and block vertices. 0 keeps the map's polygons unchanged
 		"""
 
 		# Initalise PyGame Window
@@ -50,6 +55,8 @@ class Game():
 		self.running = True  	
 		self.train = train
 		self.lidar = lidar
+		self.car_collisions = car_collisions
+		self.lidar_mode = lidar_mode
 
 		# Create & Display Backgound
 		self.screen = pg.display.set_mode((W_WIDTH, W_HEIGHT))
@@ -59,12 +66,11 @@ class Game():
 		pg.display.flip()
 
 		# Create Map
-		if train: 
-			mapPath = 'assets/Map_Train.tmx'
-			global NUM_CHECKPOINTS
-			NUM_CHECKPOINTS = 15
-		else: mapPath = 'assets/Map_Run.tmx'
-		self.map = TiledMap(mapPath)
+		if map_path is None:
+			if train: map_path = 'assets/Map_Train.tmx'
+			else: map_path = 'assets/Map_Run.tmx'
+		self.map_path = map_path
+		self.map = TiledMap(map_path)
 		self.map_img = self.map.make_map()
 		self.map_rect = self.map_img.get_rect()
 		
@@ -77,28 +83,58 @@ class Game():
 			else:
 				points = [pg.math.Vector2(p)*msf for p in tile_object.points]	
 				if ('wall' in tile_object.name.lower()):
-					self.walls[tile_object.name] = Line(points) 	
+					self.walls[tile_object.name] = Line(simplify_points(points, simplify)) 	
 				elif ('block' in tile_object.name.lower()):
-					self.blocks[tile_object.name] = Line(points) 
+					self.blocks[tile_object.name] = Line(simplify_points(points, simplify)) 
 				elif ('checkpoint' in tile_object.name.lower()):
 					self.checkpoints[int(tile_object.name[-2:])] = Line(points) 
 
+		# Compile & Check Track Geometry
+		self.geometry = TrackGeometry(self.walls, self.blocks, self.checkpoints)
+		for warning in self.geometry.validate():
+			print(f"Track warning ({map_path}): {warning}")
+
 		# Add all sprites
 		self.race_won = None
 		self.AIs, self.Humans = [], []
 		self.all_sprites = pg.sprite.RenderPlain()
 		self.AI_spawn, self.Human_spawn = None, None
+		self.spawn_points = spawn_points
 		for key, pt in spawn_points.items():
 			if 'AI' in key and AI: self.AI_spawn = pt
 			elif 'Human' in key and Human: self.Human_spawn = pt
 		self.checkpoint_flash = Checkpoints(self.checkpoints)
 		self.text = Text()
 
-	def create_AI(self):
+	def reset(self):
+		"""
+		Removes all cars so the loaded map can be reused for a new race
+		"""
+		self.running = True
+		self.race_won = None
+		self.AIs, self.Humans = [], []
+		self.all_sprites.empty()
+		self.screen = pg.display.get_surface()
+		self.text.init_ticks = None
+
+	def get_spawn(self, spawn, default):
+		"""
+		Returns the spawn point as a Vector2()
+		@param spawn: Name of a spawn object in the map, an (x,y) point or None
+		@param Vector2() default: Point used when spawn is None
+		"""
+		if spawn is None: return pg.math.Vector2(default)
+		if isinstance(spawn, str): return pg.math.Vector2(self.spawn_points[spawn])
+		return pg.math.Vector2(spawn)
+
+	def create_AI(self, spawn=None, heading=-90):
 		"""
 		Initalise and create an AI instance of a car
+		@param spawn: Name of a spawn object in the map or an (x,y) point
+		@param int heading: Initial heading of the car (deg)
 		"""
-		car = Car_AI(self.AI_spawn, -90, self.blocks, self.checkpoints, self.walls, color=randint(1,3))
+		car = Car_AI(self.get_spawn(spawn, self.AI_spawn), heading, self.blocks, 
+			self.checkpoints, self.geometry.walls, color=randint(1,3), lidar_mode=self.lidar_mode)
 		self.AIs.append(car)
 		self.all_sprites.add(car)
 		return car
@@ -112,13 +148,15 @@ class Game():
 		self.all_sprites.add(car)
 		return car
 
-	def run(self):
+	def run(self, recorder=None):
 		"""
 		Executes the main game loop.
+		@param DrivingRecorder() recorder: If given, records the focus car every frame
 		"""
 		while self.running:
 			self.clock.tick(60)	
 			self.process_events()
+			if recorder != None: recorder.record()
 			self.update()
 			self.draw()
 			if self.race_won != None: break
@@ -159,6 +197,16 @@ class Game():
 					offRoad = insideOuterWall == insideInnerWall
 				sprite.update(offRoad = offRoad)
 				if sprite.laps_done() == NUM_LAPS: self.race_won = i
+		if self.car_collisions: self.collide_cars()
+
+	def collide_cars(self):
+		"""
+		Detects and resolves collisions between all cars still racing
+		"""
+		cars = [sprite for sprite in self.all_sprites.sprites() if sprite.is_alive()]
+		for car, other in find_overlapping_pairs(cars):
+			displacement = polygon_overlap(car.points, other.points)
+			if displacement != None: car.collide(other, displacement)
 			
 	def draw(self):
 		"""
@@ -173,7 +221,7 @@ class Game():
 		self.text.draw(self.screen, sprite.laps_done())
 		if not self.train:
 			self.checkpoint_flash.draw(self.screen, self.camera_offset, 
-				self.focus_car.checkpoints_passed%NUM_CHECKPOINTS+1)
+				self.focus_car.checkpoints_passed%len(self.checkpoints)+1)
 		pg.display.flip()	
 
 	def set_focus_car(self, sprite):
@@ -301,6 +349,7 @@ class Car(pg.sprite.Sprite):
 		self.d_t = (60.0/1000.0) 		# Change in time (FPS)
 		self.accel_coeff = 0.3	 		# Acceleration Coeff
 		self.max_vel = 8.571*(0.7/self.friction)*(self.d_accel/6)
+		self.restitution = 0.5			# Bounce coeff when hitting other cars
 
 		self.rotate(degree * (pi/180))
 		self.move(point)
@@ -420,7 +469,7 @@ class Car(pg.sprite.Sprite):
 		"""
 		Update the number of checkpoints the car has passed
 		"""
-		next_cp = self.checkpoints_passed % NUM_CHECKPOINTS
+		next_cp = self.checkpoints_passed % len(self.checkpoints)
 		#print(next_cp)
 		if self.checkpoints[int(next_cp)].inside_polygon(self.rect.center):
 			self.reward += 10
@@ -440,6 +489,38 @@ class Car(pg.sprite.Sprite):
 		adjusted_pts = [p + pg.math.Vector2(camera_offset) for p in self.points]
 		pg.draw.polygon(screen, color, adjusted_pts, width)
 
+	def collide(self, other, displacement):
+		"""
+		Pushes this car and the other car apart and bounces their velocities
+		along the collision normal. Both cars are treated as equal mass.
+		@param Car() other: The car that has been hit
+		@param Vector2() displacement: Translation that moves self out of other
+		"""
+		self.move(displacement/2)
+		other.move(-displacement/2)
+		self.rect = update_rect(self.points)
+		other.rect = update_rect(other.points)
+		normal = displacement.normalize()
+		closing_vel = (self.vel - other.vel).dot(normal)
+		if closing_vel < 0:
+			impulse = normal * closing_vel * (1+self.restitution)/2
+			self.vel -= impulse
+			other.vel += impulse
+
+	def place(self, center, vel=(0,0), checkpoints_passed=0):
+		"""
+		Moves the car to the center point with the velocity, as if it had
+		already passed a number of checkpoints
+		@param tuple center: (x,y) point the car's center is moved to
+		@param tuple vel: (x,y) velocity of the car
+		@param int checkpoints_passed: Checkpoints counted as already passed
+		"""
+		self.rect = update_rect(self.points)
+		self.move(pg.math.Vector2(center) - self.rect.center)
+		self.rect = update_rect(self.points)
+		self.vel = pg.math.Vector2(vel)
+		self.checkpoints_passed = checkpoints_passed
+
 	def get_midpoint(self, start, end):
 		"""
 		Get midpoint of two Vector2() points
@@ -452,7 +533,7 @@ class Car(pg.sprite.Sprite):
 		"""
 		Number of laps completed by the car
 		"""
-		return int((self.checkpoints_passed)/NUM_CHECKPOINTS)
+		return int((self.checkpoints_passed)/len(self.checkpoints))
 
 	def is_AI(self):
 		"""
@@ -479,9 +560,13 @@ class Car_AI(Car):
 	Defines the functions used when the car is controlled by the NEAT algorithmn
 	"""
 	
-	def __init__(self, point, degree, obstacles, checkpoints, walls, color=1):
+	def __init__(self, point, degree, obstacles, checkpoints, walls, color=1, lidar_mode='full'):
+		"""
+		@param walls: Dict of Line()'s, or their Segments(), that the lidar detects
+		@param string lidar_mode: 'full', 'incremental' or 'exact' LidarSensor() mode
+		"""
 		Car.__init__(self, point, degree, obstacles, checkpoints, color=color)
-		self.lidar = LidarSensor(walls)
+		self.lidar = LidarSensor(walls, mode=lidar_mode)
 		self.turn_input = 0
 		self.speed_input = 0
 		self.AI = True
@@ -525,14 +610,35 @@ class Car_AI(Car):
 class LidarSensor():
 	"""
 	Mimics the output of a lidar sensor mounted on the top of a car. Returns the 
-	distance to obstacles at 45 deg intevals from the car's edges
+	distance to the nearest obstacle at 45 deg intevals from the car's edges,
+	or 250 when a line hits nothing. Every mode returns the same distances.
+
+	The 'full' mode tests every lidar line against every obstacle segment. The
+	'incremental' mode first tests the segments around the segment each line 
+	last hit. Any nearer hit lies between the car and that hit, so it then only
+	tests the segments in the grid cells that part of the line passes near. A
+	line whose neighbours miss falls back to the segments near the whole line.
+	The 'exact' mode runs both, returns the full query and counts the mismatches.
 	"""
-	def __init__(self, obstacles):
-		"""@param Obstacles list of Line()'s"""
-		self.obstacles = obstacles
+	def __init__(self, obstacles, mode='full', window=1):
+		"""
+		@param Obstacles dict of Line()'s or their packed Segments()
+		@param string mode: 'full', 'incremental' or 'exact'
+		@param int window: Neighbouring segments re-tested each side of the last hit
+		"""
+		if not isinstance(obstacles, Segments): obstacles = Segments(obstacles)
+		self.segments = obstacles
+		self.obstacles = obstacles.lines
+		self.mode = mode
+		self.window = window
 		self.center = (0,0)
 		self.lidar_lines = []
 		self.collisions = []
+		self.last_hits = []		# Segment row last hit by each line, None if it hit nothing
+		self.queries = 0		# Number of lidar line queries
+		self.tested = 0			# Segments tested by incremental queries
+		self.fallbacks = 0		# Incremental queries whose neighbouring segments missed
+		self.mismatches = 0		# Incremental distances that differed in 'exact' mode
 
 	def get_lidar_distances(self, center, headings):
 		"""
@@ -540,7 +646,10 @@ class LidarSensor():
 		"""
 		center = pg.math.Vector2(center)
 		self.lidar_lines = self.get_lidar_lines(center, headings)
-		distances = self.get_collisions(center, self.lidar_lines)
+		if self.mode == 'full':
+			distances = self.get_collisions(center, self.lidar_lines)
+		else:
+			distances = self.get_incremental_collisions(center, self.lidar_lines)
 		return distances
 
 	def get_lidar_lines(self, center, heading):
@@ -573,23 +682,106 @@ class LidarSensor():
 			
 	def get_collisions(self, center, lidar_line):
 		"""
+		Gets the distance to the nearest collision of each lidar line by testing
+		every obstacle segment
 		@param lidar_line list of tuples of Vector2() of form (x,y)
 		"""
-		distances = []
-		self.collisions = []
-		for i, l in enumerate(lidar_line):
-			line_cols = []
-			for o in self.obstacles.items():    				
-				collision_pt = o[1].is_line_collision(l[0], l[1])
-				if collision_pt == None:
-					col_flag = True
-					line_cols.append(250)
-				else:
-					self.collisions.append(collision_pt)
-					line_cols.append(int(center.distance_to(collision_pt)))
-			distances.append(int(min(line_cols)))
+		self.queries += len(lidar_line)
+		hits, xs, ys = self.segments.intersect(lidar_line)
+		distances, self.collisions, self.last_hits = self.nearest_hits(center, hits, xs, ys)
+		return distances
+
+	def get_incremental_collisions(self, center, lidar_line):
+		"""
+		Gets the distance to the nearest collision of each lidar line, starting
+		from the segments hit by the same line on the previous call
+		@param lidar_line list of tuples of Vector2() of form (x,y)
+		"""
+		if len(self.last_hits) != len(lidar_line):
+			self.last_hits = [None]*len(lidar_line)
+		self.queries += len(lidar_line)
+		distances, collisions, last_hits = [], [], []
+		for line, row in zip(lidar_line, self.last_hits):
+			# Nearest hit on the segments around the last hit
+			rows = self.segments.neighbours(row, self.window) if row != None else []
+			distance, point, hit_row = self.nearest_row_hit(center, line, rows)
+
+			# Then any nearer hit on the segments near the line up to that hit
+			if point == None:
+				self.fallbacks += 1
+				near = self.segments.near(line)
+			else:
+				near = self.segments.near((center, point))
+			near.difference_update(rows)
+			self.tested += len(rows) + len(near)
+			nearer = self.nearest_row_hit(center, line, near)
+			if nearer[0] < distance: distance, point, hit_row = nearer
+
+			last_hits.append(hit_row)
+			if point == None:
+				distances.append(250)
+			else:
+				distances.append(int(distance))
+				collisions.append(pg.math.Vector2(point))
+		self.collisions, self.last_hits = collisions, last_hits
+
+		if self.mode == 'exact':
+			exact = self.get_collisions(center, lidar_line)
+			self.queries -= len(lidar_line)
+			self.mismatches += sum([a != b for a, b in zip(distances, exact)])
+			self.collisions, self.last_hits = collisions, last_hits
+			distances = exact
 		return distances
 
+	def nearest_row_hit(self, center, line, rows):
+		"""
+		Finds the collision of a lidar line with the segments in rows that is
+		closest to center
+		@return float: Distance to the collision, inf if none
+		@return tuple: (x,y) collision point or None
+		@return int: Segment row of the collision or None
+		"""
+		nearest, point, hit_row = inf, None, None
+		for row in rows:
+			hit = self.segments.intersect_row(line, row)
+			if hit == None: continue
+			dx, dy = hit[0] - center.x, hit[1] - center.y
+			distance = sqrt(dx*dx + dy*dy)
+			if distance < nearest: nearest, point, hit_row = distance, hit, row
+		return nearest, point, hit_row
+
+	def counts(self):
+		"""
+		Returns the query counters of the sensor
+		"""
+		return {'queries': self.queries, 'tested': self.tested, 
+			'fallbacks': self.fallbacks, 'mismatches': self.mismatches}
+
+	def nearest_hits(self, center, hits, xs, ys, rows=None):
+		"""
+		Finds the collision of each lidar line closest to center
+		@param array hits, xs, ys: Segments.intersect() results
+		@param list rows: Segment rows the results are for, default every row
+		@return list: Distance to the nearest collision of each line, 250 if none
+		@return list: Nearest collision point of each line or None
+		@return list: Segment row of the nearest collision of each line or None
+		"""
+		dx, dy = xs - center.x, ys - center.y
+		with np.errstate(invalid='ignore'):
+			lengths = np.where(hits, np.sqrt(dx*dx + dy*dy), np.inf)
+		if lengths.shape[1] == 0: return [250]*len(hits), [None]*len(hits), [None]*len(hits)
+		distances, points, hit_rows = [], [], []
+		for i, column in enumerate(np.argmin(lengths, axis=1)):
+			if lengths[i, column] == np.inf:
+				distances.append(250)
+				points.append(None)
+				hit_rows.append(None)
+			else:
+				distances.append(int(lengths[i, column]))
+				points.append(pg.math.Vector2(xs[i, column], ys[i, column]))
+				hit_rows.append(int(rows[column]) if rows is not None else int(column))
+		return distances, points, hit_rows
+
 	def draw(self, screen, camera_offset, color=pg.Color("black"), width = 2):
 		"""
 		Draws the lines that make up self.points
@@ -670,17 +862,29 @@ class Line():
 		@param Vector2() start: First point of the input line
 		@param Vector2() end: End point of the input line
 		"""
-		x3, y3, x4, y4 = tuple(start) + tuple(end)
 		for i in range(-1, len(self.points)-1):
-			x1, y1, x2, y2 = tuple(self.points[i]) + tuple(self.points[i+1])
-			denomA = ((y4-y3)*(x2-x1) - (x4-x3)*(y2-y1))
-			denomB = ((y4-y3)*(x2-x1) - (x4-x3)*(y2-y1))
-			if denomA == 0 or denomB == 0: continue
-			uA = ((x4-x3)*(y1-y3) - (y4-y3)*(x1-x3)) / denomA
-			uB = ((x2-x1)*(y1-y3) - (y2-y1)*(x1-x3)) / denomB
-			if (uA >= 0 and uA <= 1 and uB >= 0 and uB <= 1): 
-				intersection_pt = pg.math.Vector2(x1 + (uA * (x2-x1)), y1 + (uA * (y2-y1)))
-				return intersection_pt
+			intersection_pt = self.segment_collision(i, start, end)
+			if intersection_pt != None: return intersection_pt
+		return None
+
+	def segment_collision(self, index, start, end):
+		"""
+		Detects if there is a collision between the input line and the segment
+		from self.points[index] to the following point. Returns the collision point.
+		@param int index: Index of the segment's first point
+		@param Vector2() start: First point of the input line
+		@param Vector2() end: End point of the input line
+		"""
+		x3, y3, x4, y4 = tuple(start) + tuple(end)
+		x1, y1 = self.points[index]
+		x2, y2 = self.points[(index+1) % len(self.points)]
+		denomA = ((y4-y3)*(x2-x1) - (x4-x3)*(y2-y1))
+		denomB = ((y4-y3)*(x2-x1) - (x4-x3)*(y2-y1))
+		if denomA == 0 or denomB == 0: return None
+		uA = ((x4-x3)*(y1-y3) - (y4-y3)*(x1-x3)) / denomA
+		uB = ((x2-x1)*(y1-y3) - (y2-y1)*(x1-x3)) / denomB
+		if (uA >= 0 and uA <= 1 and uB >= 0 and uB <= 1): 
+			return pg.math.Vector2(x1 + (uA * (x2-x1)), y1 + (uA * (y2-y1)))
 		return None
 
 	def is_collision(self, shape_points):
@@ -703,6 +907,175 @@ class Line():
 			pg.draw.line(screen, color, pt1, pt2, width)
 
 
+class Segments():
+	"""
+	Packs the segments of a dict of Line()'s into contiguous arrays so they can 
+	all be queried at once
+	"""
+
+	def __init__(self, lines, cell=128):
+		"""
+		@param dict lines: Line()'s to pack. Each line's segments are stored in
+			the order Line.is_line_collision tests them
+		@param int cell: Size (px) of the grid cells the segments are indexed by
+		"""
+		self.lines = lines
+		self.keys = []		# (line key, segment index) of each row
+		self.ranges = []	# (first, last) rows of each line
+		self.row_ranges = []	# (first, last) rows of the line each row belongs to
+		starts, ends = [], []
+		for key, line in lines.items():
+			first = len(starts)
+			for i in range(-1, len(line.points)-1):
+				starts.append(tuple(line.points[i]))
+				ends.append(tuple(line.points[i+1]))
+				self.keys.append((key, i % len(line.points)))
+			self.ranges.append((first, len(starts)))
+			self.row_ranges.extend([(first, len(starts))]*len(line.points))
+		self.starts = np.array(starts, dtype=float).reshape(-1, 2)
+		self.ends = np.array(ends, dtype=float).reshape(-1, 2)
+		self.dirs = self.ends - self.starts
+		self.lengths = np.sqrt(self.dirs[:,0]*self.dirs[:,0] + self.dirs[:,1]*self.dirs[:,1])
+		self.bboxes = np.hstack([np.minimum(self.starts, self.ends), np.maximum(self.starts, self.ends)])
+		self.rows = [tuple(r) for r in np.hstack([self.starts, self.dirs]).tolist()]	# (x, y, dx, dy) of each row
+		self.cell = cell
+		self.grid = self.build_grid()	# Rows of the segments passing near each (column, row) cell
+
+	def intersect(self, lines, rows=None):
+		"""
+		Intersects each input line with every segment, using the same arithmetic 
+		as Line.segment_collision
+		@param list lines: (start, end) tuples of Vector2()'s
+		@param list rows: Only intersect the segments in these rows
+		@return array hits: (lines, segments) bool of which pairs intersect
+		@return array xs, ys: (lines, segments) coordinates of the intersections
+		"""
+		starts, dirs = self.starts, self.dirs
+		if rows is not None: starts, dirs = starts[rows], dirs[rows]
+		line_starts = np.array([tuple(l[0]) for l in lines], dtype=float)
+		line_dirs = np.array([tuple(l[1]) for l in lines], dtype=float) - line_starts
+		x43, y43 = line_dirs[:,0:1], line_dirs[:,1:2]
+		x21, y21 = dirs[:,0], dirs[:,1]
+		x13 = starts[:,0] - line_starts[:,0:1]
+		y13 = starts[:,1] - line_starts[:,1:2]
+		denom = y43*x21 - x43*y21
+		with np.errstate(divide='ignore', invalid='ignore'):
+			uA = (x43*y13 - y43*x13) / denom
+			uB = (x21*y13 - y21*x13) / denom
+			hits = (denom != 0) & (uA >= 0) & (uA <= 1) & (uB >= 0) & (uB <= 1)
+			return hits, starts[:,0] + uA*x21, starts[:,1] + uA*y21
+
+	def neighbours(self, row, window=1):
+		"""
+		Returns the row and the rows of the segments either side of it in its line
+		"""
+		first, last = self.row_ranges[row]
+		n = last - first
+		return [first + (row - first + d) % n for d in range(-window, window+1)]
+
+	def intersect_row(self, line, row):
+		"""
+		Intersects a line with the segment in a row, using the same arithmetic 
+		as intersect()
+		@param tuple line: (start, end) Vector2()'s
+		@return tuple: (x,y) intersection point or None
+		"""
+		x1, y1, x21, y21 = self.rows[row]
+		x3, y3 = line[0]
+		x43, y43 = line[1][0] - x3, line[1][1] - y3
+		x13, y13 = x1 - x3, y1 - y3
+		denom = y43*x21 - x43*y21
+		if denom == 0: return None
+		uA = (x43*y13 - y43*x13) / denom
+		uB = (x21*y13 - y21*x13) / denom
+		if uA < 0 or uA > 1 or uB < 0 or uB > 1: return None
+		return (x1 + uA*x21, y1 + uA*y21)
+
+	def build_grid(self, margin=1):
+		"""
+		Returns the rows of the segments that pass within margin (px) of each
+		grid cell
+		"""
+		grid = {}
+		for row, (x1, y1, x2, y2) in enumerate(self.bboxes.tolist()):
+			x, y, dx, dy = self.rows[row]
+			for i in range(int((x1 - margin)//self.cell), int((x2 + margin)//self.cell) + 1):
+				for j in range(int((y1 - margin)//self.cell), int((y2 + margin)//self.cell) + 1):
+					# The segment passes the cell if its corners are not all on one side
+					sides = [dx*(cy - y) - dy*(cx - x) 
+						for cx in (i*self.cell - margin, (i+1)*self.cell + margin)
+						for cy in (j*self.cell - margin, (j+1)*self.cell + margin)]
+					if min(sides) <= 0 <= max(sides): grid.setdefault((i, j), []).append(row)
+		return grid
+
+	def near(self, line, margin=1):
+		"""
+		Returns the set of rows of the segments in the grid cells that the
+		bounding box of a line, grown by margin (px), overlaps
+		@param tuple line: (start, end) points
+		"""
+		(x1, y1), (x2, y2) = line
+		rows = set()
+		for i in range(int((min(x1, x2) - margin)//self.cell), int((max(x1, x2) + margin)//self.cell) + 1):
+			for j in range(int((min(y1, y2) - margin)//self.cell), int((max(y1, y2) + margin)//self.cell) + 1):
+				rows.update(self.grid.get((i, j), ()))
+		return rows
+
+
+class TrackGeometry():
+	"""
+	Compiled track geometry. Packs the walls, which every lidar line is tested
+	against, into Segments() and checks the track for mistakes. Blocks and
+	checkpoints are only tested one point at a time, which their Line()'s 
+	matplotlib Path already does faster than the packed arrays can.
+	"""
+
+	def __init__(self, walls, blocks, checkpoints):
+		self.walls = Segments(walls)
+		self.blocks = blocks
+		self.checkpoints = checkpoints
+
+	def validate(self):
+		"""
+		Returns a list of warnings for degenerate or self-intersecting polygons
+		and checkpoints that are missing, off the road or out of order
+		"""
+		warnings = []
+		checkpoints = Segments(self.checkpoints)
+		for segments in (self.walls, Segments(self.blocks), checkpoints):
+			for key, line in segments.lines.items():
+				if len(line.points) < 3:
+					warnings.append(f"{key} has fewer than 3 points")
+				elif polygon_self_intersects(line.points):
+					warnings.append(f"{key} intersects itself")
+			for row in np.flatnonzero(segments.lengths == 0):
+				warnings.append(f"{segments.keys[row][0]} has a zero length segment")
+
+		if sorted(self.checkpoints) != list(range(len(self.checkpoints))):
+			warnings.append(f"Checkpoints are not numbered 0 to {len(self.checkpoints)-1}")
+			return warnings
+		walls = self.walls.lines
+		if 'OuterWall' not in walls or 'InnerWall' not in walls: return warnings
+
+		# Checkpoints must lie on the road, and the path from one checkpoint to
+		# the next must not pass through any other checkpoint
+		mids = []
+		for key in range(len(self.checkpoints)):
+			points = self.checkpoints[key].points
+			mid = sum(points, pg.math.Vector2()) / len(points)
+			if not walls['OuterWall'].inside_polygon(mid) or walls['InnerWall'].inside_polygon(mid):
+				warnings.append(f"Checkpoint {key} is not on the road")
+			mids.append(mid)
+		paths = [(mids[i], mids[(i+1) % len(mids)]) for i in range(len(mids))]
+		hits = checkpoints.intersect(paths)[0]
+		for i in range(len(paths)):
+			passed = set([checkpoints.keys[row][0] for row in np.flatnonzero(hits[i])])
+			passed -= set([i, (i+1) % len(mids)])
+			if len(passed):
+				warnings.append(f"Checkpoint {(i+1) % len(mids)} is out of order, reached after {sorted(passed)}")
+		return warnings
+
+
 class Camera():
 	"""
 	Defines which areas of the map are shown on the pygame 
@@ -782,6 +1155,97 @@ def update_rect(points):
 	height = max_y - min_y
 	return pg.Rect((min_x, min_y), (width, height))
 
+def find_overlapping_pairs(cars):
+	"""
+	Broad phase collision check. Sorts the cars along the x axis and sweeps
+	through them so only cars whose bounding boxes overlap are paired.
+	@param list cars: Car() sprites to test
+	@return list: (car, other) tuples with overlapping bounding boxes
+	"""
+	boxes = []
+	for car in cars:
+		xs = [p.x for p in car.points]
+		ys = [p.y for p in car.points]
+		boxes.append((min(xs), max(xs), min(ys), max(ys), car))
+	boxes.sort(key=lambda box: box[0])
+	pairs, active = [], []
+	for box in boxes:
+		active = [a for a in active if a[1] >= box[0]]
+		for a in active:
+			if a[2] <= box[3] and box[2] <= a[3]: pairs.append((a[4], box[4]))
+		active.append(box)
+	return pairs
+
+def polygon_overlap(points1, points2):
+	"""
+	Narrow phase collision check between two convex polygons using the 
+	separating axis theorem.
+	@param list points1: Vector2() points of the first polygon
+	@param list points2: Vector2() points of the second polygon
+	@return Vector2(): Smallest translation that moves the first polygon 
+		out of the second, or None if they do not overlap
+	"""
+	min_overlap, min_axis = inf, None
+	for points in (points1, points2):
+		for i in range(-1, len(points)-1):
+			edge = points[i+1] - points[i]
+			if edge.length_squared() == 0: continue
+			axis = pg.math.Vector2(-edge.y, edge.x).normalize()
+			proj1 = [axis.dot(p) for p in points1]
+			proj2 = [axis.dot(p) for p in points2]
+			overlap = min(max(proj1), max(proj2)) - max(min(proj1), min(proj2))
+			if overlap <= 0: return None
+			if overlap < min_overlap: min_overlap, min_axis = overlap, axis
+	if min_axis == None: return None
+	center1 = sum(points1, pg.math.Vector2()) / len(points1)
+	center2 = sum(points2, pg.math.Vector2()) / len(points2)
+	if min_axis.dot(center1 - center2) < 0: min_axis = -min_axis
+	return min_axis * min_overlap
+
+def simplify_points(points, tolerance):
+	"""
+	Removes the vertices of a closed polygon that are within tolerance of the
+	line joining their neighbours
+	@param list points: Vector2() points of the polygon
+	@param float tolerance: Max distance (pixels) of a removed vertex
+	"""
+	points = list(points)
+	removed = tolerance > 0
+	while removed and len(points) > 3:
+		removed = False
+		for i in range(len(points)):
+			prev, point, next = points[i-1], points[i], points[(i+1) % len(points)]
+			base = next - prev
+			if base.length() == 0: distance = point.distance_to(prev)
+			else: distance = abs(base.cross(point - prev)) / base.length()
+			if distance <= tolerance:
+				del points[i]
+				removed = True
+				break
+	return points
+
+def polygon_self_intersects(points):
+	"""
+	Returns True if any two non-adjacent edges of the closed polygon cross
+	"""
+	n = len(points)
+	edges = [(points[i], points[(i+1) % n]) for i in range(n)]
+	for i in range(n):
+		for j in range(i+2, n):
+			if i == 0 and j == n-1: continue
+			if segments_intersect(edges[i][0], edges[i][1], edges[j][0], edges[j][1]): return True
+	return False
+
+def segments_intersect(p1, p2, p3, p4):
+	"""
+	Returns True if the segment p1-p2 properly crosses the segment p3-p4
+	"""
+	d1 = (p2 - p1).cross(p3 - p1)
+	d2 = (p2 - p1).cross(p4 - p1)
+	d3 = (p4 - p3).cross(p1 - p3)
+	d4 = (p4 - p3).cross(p2 - p3)
+	return d1*d2 < 0 and d3*d4 < 0
+
 def scale_image(image, width):
 	"""
 	Scales image to new width. Maintains ratio of width & height.
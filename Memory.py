@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# File:             	Memory.py
+# Date:             	20/09/2021
+# Author:          	Marc Rocca
+# Modifications:    	Null
+
+"""
+Measures the memory used by training each generation so that leaks can be
+found and the number of training workers that fit on a machine can be sized.
+"""
+
+import os
+import sys
+import inspect
+import linecache
+import tracemalloc
+import neat
+from collections import deque
+
+# Classes and packages whose allocations are counted towards each subsystem
+SUBSYSTEMS = {
+	'map': ['TiledMap', 'pytmx'],
+	'sprites': ['Car', 'Car_AI', 'Checkpoints', 'Text', 'pygame'],
+	'geometry': ['Line', 'Segments', 'TrackGeometry', 'LidarSensor', 'matplotlib'],
+	'networks': ['neat']}
+
+class MemoryReporter(neat.reporting.BaseReporter):
+	"""
+	NEAT reporter that records the resident memory of the training processes
+	after each generation is evaluated, and flags any measurement that has 
+	grown in each of its last 'window' measurements. Tracing allocations slows
+	evaluation down many times, so the Python allocations of each subsystem
+	are only traced every 'interval' generations. Those generations count the 
+	allocations made while they were evaluated that are still alive.
+	"""
+
+	def __init__(self, top=10, window=5, min_growth=1<<20, frames=3, pids=None, counters=None, 
+		surfaces=None, interval=10):
+		"""
+		@param int top: Number of largest allocation sites recorded
+		@param int window: Measurements a measurement must grow for to be flagged
+		@param int min_growth: Bytes a measurement must grow by over the window to be flagged
+		@param int frames: Stack frames traced for each allocation
+		@param function pids: Returns the process ids of the training workers
+		@param function counters: Returns a dict of extra sizes to record, such as cache entries
+		@param function surfaces: Returns the bytes of the pygame surfaces of each subsystem,
+			which are allocated by SDL and not traced
+		@param int interval: Generations between the generations whose allocations are traced
+		"""
+		self.top = top
+		self.window = window
+		self.min_growth = min_growth
+		self.frames = frames
+		self.pids = pids
+		self.counters = counters
+		self.surfaces = surfaces
+		self.interval = interval
+		self.history = {}	# Latest measurements of each name
+		self.last = {}
+		self.rules = None
+		self.matches = {}	# Subsystem of each (filename, line), None if no rule matches
+		self.generation = None
+
+	def start_generation(self, generation):
+		if generation % self.interval == 0 and not tracemalloc.is_tracing(): 
+			tracemalloc.start(self.frames)
+		self.generation = generation
+
+	def post_evaluate(self, config, population, species, best_genome):
+		"""
+		Measures the memory in use once the generation has been evaluated
+		"""
+		measurements = {'rss': get_rss(os.getpid())}
+		if self.pids != None:
+			measurements['worker_rss'] = sum([get_rss(pid) or 0 for pid in self.pids()])
+		counters = self.counters() if self.counters != None else {}
+		measurements.update({f"counter.{name}": value for name, value in counters.items()})
+		surfaces = self.surfaces() if self.surfaces != None else {}
+		measurements.update({f"surface.{name}": size for name, size in surfaces.items()})
+		self.last = {
+			'rss': measurements['rss'],
+			'worker_rss': measurements.get('worker_rss'),
+			'counters': counters,
+			'surfaces': surfaces}
+
+		# Attribute the allocations traced during this generation
+		if tracemalloc.is_tracing():
+			snapshot = tracemalloc.take_snapshot()
+			traced, peak = tracemalloc.get_traced_memory()
+			overhead = tracemalloc.get_tracemalloc_memory()
+			tracemalloc.stop()
+			subsystems, top = self.attribute(snapshot)
+			measurements['traced'] = traced
+			measurements.update({f"subsystem.{name}": size for name, size in subsystems.items()})
+			self.last.update({
+				'traced': traced,
+				'traced_peak': peak,
+				'tracemalloc_overhead': overhead,
+				'subsystems': subsystems,
+				'top': top})
+
+		growing = self.update_history(measurements)
+		for name in growing:
+			print(f" Memory warning: {name} has grown for {self.window} measurements "
+				f"to {self.history[name][-1]}")
+		self.last['growing'] = growing
+
+	def attribute(self, snapshot):
+		"""
+		Returns the traced bytes of each subsystem and the largest allocation 
+		sites, leaving out the profiler's own allocations. Each allocation is 
+		counted towards the subsystem of the most recent frame that belongs to one.
+		"""
+		if self.rules == None: self.rules = subsystem_rules()
+		skip = set(profiler_files())
+		sizes = {name: 0 for name in SUBSYSTEMS}
+		sizes['other'] = 0
+		sites = {}
+		for stat in snapshot.statistics('traceback'):
+			frame = stat.traceback[-1]
+			if frame.filename in skip: continue
+			sizes[match_subsystem(stat.traceback, self.rules, self.matches)] += stat.size
+			site = sites.setdefault(f"{frame.filename}:{frame.lineno}", [0, 0])
+			site[0] += stat.size
+			site[1] += stat.count
+		top = sorted(sites.items(), key=lambda site: site[1][0], reverse=True)[:self.top]
+		return sizes, [{'where': where, 'size': size, 'count': count} for where, (size, count) in top]
+
+	def update_history(self, measurements):
+		"""
+		Adds the measurements to their history and returns the names of those
+		that have grown in every measurement of the window
+		"""
+		growing = []
+		for name, value in measurements.items():
+			if value == None: continue
+			history = self.history.setdefault(name, deque(maxlen=self.window + 1))
+			history.append(value)
+			if len(history) <= self.window: continue
+			values = list(history)
+			if all([b > a for a, b in zip(values, values[1:])]) and values[-1] - values[0] >= self.min_growth:
+				growing.append(name)
+		return growing
+
+	def report(self):
+		"""
+		Returns the measurements of the last generation
+		"""
+		return self.last
+
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		state['rules'] = None
+		state['matches'] = {}
+		return state
+
+
+def get_rss(pid):
+	"""
+	Returns the resident memory (bytes) of a process, or the peak resident
+	memory of this process where /proc is not available. Returns None where
+	neither is available, such as on Windows.
+	"""
+	try:
+		with open(f"/proc/{pid}/statm") as f:
+			return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+	except (OSError, ValueError, AttributeError):
+		if pid != os.getpid(): return None
+	try:
+		import resource
+	except ImportError:
+		return None
+	scale = 1 if sys.platform == 'darwin' else 1024
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+def profiler_files():
+	"""
+	Returns the files of the profiler itself, whose allocations (such as the
+	source lines read by inspect) are not counted
+	"""
+	return [tracemalloc.__file__, linecache.__file__, inspect.__file__, __file__]
+
+def subsystem_rules():
+	"""
+	Returns (subsystem, filename, first line, last line) rules for the classes
+	and packages in SUBSYSTEMS. Packages match every line of their files.
+	"""
+	game = sys.modules.get('Game')
+	rules = []
+	for name, owners in SUBSYSTEMS.items():
+		for owner in owners:
+			cls = getattr(game, owner, None)
+			if inspect.isclass(cls):
+				lines, first = inspect.getsourcelines(cls)
+				rules.append((name, os.path.abspath(inspect.getsourcefile(cls)), first, first + len(lines)))
+			else:
+				rules.append((name, os.sep + owner + os.sep, None, None))
+	return rules
+
+def match_subsystem(traceback, rules, matches=None):
+	"""
+	Returns the subsystem of the most recent frame of the traceback that a rule matches
+	@param dict matches: Cache of the subsystem of each (filename, line), None if no rule matches
+	"""
+	if matches == None: matches = {}
+	for frame in reversed(traceback):
+		key = (frame.filename, frame.lineno)
+		if key not in matches: matches[key] = match_frame(frame, rules)
+		if matches[key] != None: return matches[key]
+	return 'other'
+
+def match_frame(frame, rules):
+	"""
+	Returns the subsystem of the first rule that matches the frame or None
+	"""
+	filename = os.path.abspath(frame.filename)
+	for name, pattern, first, last in rules:
+		if first == None:
+			if pattern in filename: return name
+		elif filename == pattern and first <= frame.lineno < last:
+			return name
+	return None
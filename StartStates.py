@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# File:             	StartStates.py
+# Date:             	20/09/2021
+# Author:          	Marc Rocca
+# Modifications:    	Null
+
+"""
+Keeps a bank of states that cars can be started from part way around a track
+so that genomes can be raced over short sections instead of whole laps.
+"""
+
+import os
+import random
+import numpy as np
+import pygame as pg
+
+STATE_COLUMNS = ['checkpoint', 'x', 'y', 'heading', 'vx', 'vy']
+
+class StartStateBank():
+	"""
+	Start states of a car that has just passed each checkpoint of a track, as
+	(checkpoint, (x,y) center, heading (deg), (x,y) velocity) tuples. States
+	recorded from good runs are used when a checkpoint has any, otherwise one
+	is derived from the checkpoint geometry. Sections that cars fail on are
+	sampled more often.
+	"""
+
+	def __init__(self, checkpoints, decay=0.8, floor=0.1):
+		"""
+		@param dict checkpoints: Line() of each checkpoint of the track
+		@param float decay: Weight kept by the old failure rate of a section when updated
+		@param float floor: Sampling weight added to every section
+		"""
+		self.num_checkpoints = len(checkpoints)
+		self.derived = derive_states(checkpoints)
+		self.recorded = {k: [] for k in range(self.num_checkpoints)}
+		self.failures = [1.0]*self.num_checkpoints	# Fraction of cars failing the section after each checkpoint
+		self.decay = decay
+		self.floor = floor
+
+	def states(self, checkpoint):
+		"""
+		Returns the start states of the checkpoint
+		"""
+		return self.recorded[checkpoint] or [self.derived[checkpoint]]
+
+	def record(self, state):
+		"""
+		Adds a state recorded from a car that has just passed a checkpoint
+		"""
+		self.recorded[state[0]].append(state)
+
+	def sample(self, n):
+		"""
+		Returns n start states, picking the sections cars fail on more often
+		"""
+		weights = [f + self.floor for f in self.failures]
+		checkpoints = random.choices(range(self.num_checkpoints), weights, k=n)
+		return [random.choice(self.states(k)) for k in checkpoints]
+
+	def update(self, state, progress, checkpoints):
+		"""
+		Updates the failure rate of the section raced from the state
+		@param list progress: Checkpoints passed by each car in the section
+		@param int checkpoints: Checkpoints in the section
+		"""
+		failed = sum([p < checkpoints for p in progress]) / len(progress)
+		k = state[0]
+		self.failures[k] = self.decay*self.failures[k] + (1-self.decay)*failed
+
+	def save(self, filename):
+		"""
+		Saves the recorded states as column arrays
+		"""
+		states = [s for k in sorted(self.recorded) for s in self.recorded[k]]
+		rows = [(k, c[0], c[1], h, v[0], v[1]) for k, c, h, v in states]
+		columns = zip(*rows) if rows else [()]*len(STATE_COLUMNS)
+		with open(filename + '.tmp', 'wb') as f:
+			np.savez(f, **{name: np.array(column, dtype=np.float64)
+				for name, column in zip(STATE_COLUMNS, columns)})
+		os.replace(filename + '.tmp', filename)
+
+	def load(self, filename):
+		"""
+		Adds the states saved in the file to the recorded states
+		"""
+		with np.load(filename) as data:
+			for row in zip(*[data[name] for name in STATE_COLUMNS]):
+				k, x, y, heading, vx, vy = [float(v) for v in row]
+				if int(k) < self.num_checkpoints:
+					self.record((int(k), (x, y), heading, (vx, vy)))
+
+
+def derive_states(checkpoints):
+	"""
+	Returns a stationary start state at the middle of each checkpoint, facing
+	the middle of the next checkpoint
+	"""
+	mids = [sum(checkpoints[k].points, pg.math.Vector2()) / len(checkpoints[k].points)
+		for k in range(len(checkpoints))]
+	states = []
+	for k, mid in enumerate(mids):
+		heading = pg.math.Vector2(0, -1).angle_to(mids[(k+1) % len(mids)] - mid)
+		states.append((k, (mid.x, mid.y), heading, (0.0, 0.0)))
+	return states
+
+def car_state(car):
+	"""
+	Returns the state of a car that has just passed a checkpoint
+	"""
+	checkpoint = (car.checkpoints_passed - 1) % len(car.checkpoints)
+	center = car.rect.center
+	return (checkpoint, (float(center[0]), float(center[1])),
+		car.heading*180/np.pi, (car.vel.x, car.vel.y))
+
+def place_car(car, state):
+	"""
+	Moves a car created with the state's heading to the state's position and velocity
+	"""
+	checkpoint, center, heading, vel = state
+	car.place(center, vel, checkpoint + 1)
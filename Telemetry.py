@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# File:             	Telemetry.py
+# Date:             	20/09/2021
+# Author:          	Marc Rocca
+# Modifications:    	Null
+
+"""
+Streams per-generation training metrics to an append-only log on disk and
+summarises or plots that log once training has finished.
+"""
+
+import sys
+import json
+import time
+import neat
+import numpy as np
+from collections import deque
+
+PERCENTILES = [0, 25, 50, 75, 100]
+
+class TelemetryReporter(neat.reporting.BaseReporter):
+	"""
+	NEAT reporter that appends one JSON line of metrics per generation to a
+	log file. Only the latest generations are kept in memory. Each record holds
+	the id of its training run so runs sharing a log can be told apart.
+	"""
+
+	def __init__(self, path, window=100, sources=None, run=None):
+		"""
+		@param string path: Log file that the metrics are appended to
+		@param int window: Number of generations kept in memory
+		@param dict sources: Extra metrics to record, as name: function returning the value
+		@param string run: Id of the training run, defaults to the time it started
+		"""
+		self.path = path
+		self.run = run or time.strftime('%Y%m%d-%H%M%S')
+		self.sources = sources or {}
+		self.history = deque(maxlen=window)
+		self.generation = None
+		self.start_time = None
+
+	def start_generation(self, generation):
+		self.generation = generation
+		self.start_time = time.time()
+
+	def post_evaluate(self, config, population, species, best_genome):
+		"""
+		Records the metrics of the generation that has just been evaluated
+		"""
+		eval_time = time.time() - self.start_time
+		genomes = list(population.values())
+		fitnesses = [g.fitness for g in genomes]
+		lengths = [getattr(g, 'episode_length', 0) for g in genomes]
+		frames = int(sum([getattr(g, 'frames_simulated', 0) for g in genomes]))
+		record = {
+			'run': self.run,
+			'generation': self.generation,
+			'time': time.time(),
+			'population': len(genomes),
+			'best_genome': best_genome.key,
+			'best_fitness': best_genome.fitness,
+			'fitness': dict(zip(map(str, PERCENTILES), np.percentile(fitnesses, PERCENTILES).tolist())),
+			'species_sizes': {sid: len(s.members) for sid, s in species.species.items()},
+			'episode_length': {'mean': float(np.mean(lengths)), 'max': max(lengths)},
+			'frames': frames,
+			'steps_per_sec': frames/eval_time if eval_time > 0 else 0,
+			'eval_time': eval_time}
+		for name, source in self.sources.items():
+			record[name] = source()
+		self.write(record)
+
+	def write(self, record):
+		"""
+		Appends the record to the log file and the in memory window
+		"""
+		self.history.append(record)
+		with open(self.path, 'a') as f:
+			f.write(json.dumps(record) + '\n')
+
+
+def read_log(path, run=None):
+	"""
+	Returns the records of one training run stored in the telemetry log. 
+	Generations logged again after resuming from a checkpoint keep only their 
+	latest record.
+	@param string run: Id of the run, defaults to the run logged last
+	"""
+	runs = read_runs(path)
+	if len(runs) == 0: return []
+	if run == None: run = list(runs)[-1]
+	records = runs[run]
+	return [records[generation] for generation in sorted(records)]
+
+def read_runs(path):
+	"""
+	Returns the records of each run in the log, by run id and then generation,
+	in the order the runs were last logged. Records from before run ids were
+	logged are grouped under None.
+	"""
+	runs = {}
+	with open(path) as f:
+		for line in f:
+			if line.strip():
+				record = json.loads(line)
+				run = record.get('run')
+				records = runs.pop(run, {})
+				records[record['generation']] = record
+				runs[run] = records
+	return runs
+
+def summarise(records, every=10):
+	"""
+	Prints a table of the key metrics for every 'every' generations
+	"""
+	print(f"{'gen':>6} {'best':>9} {'median':>9} {'species':>8} {'ep len':>8} "
+		f"{'steps/s':>9} {'eval s':>8}")
+	rows = records[::every]
+	if records and rows[-1] is not records[-1]: rows.append(records[-1])
+	for r in rows:
+		print(f"{r['generation']:>6} {r['best_fitness']:>9.2f} {r['fitness']['50']:>9.2f} "
+			f"{len(r['species_sizes']):>8} {r['episode_length']['mean']:>8.0f} "
+			f"{r['steps_per_sec']:>9.0f} {r['eval_time']:>8.2f}")
+	total_frames = sum(r['frames'] for r in records)
+	total_time = sum(r['eval_time'] for r in records)
+	print(f"\n{len(records)} generations, {total_frames} frames simulated in "
+		f"{total_time:.0f}s of evaluation")
+	memory = [r['memory'] for r in records if r.get('memory')]
+	if memory:
+		growing = sorted(set([name for m in memory for name in m['growing']]))
+		rss = [m['rss'] for m in memory if m['rss'] != None]
+		if rss: print(f"RSS {rss[0]/2**20:.0f} MB to {rss[-1]/2**20:.0f} MB")
+		print(f"Memory flagged as growing: {', '.join(growing) if growing else 'nothing'}")
+	lidar = [r['lidar'] for r in records if r.get('lidar')]
+	if lidar and lidar[-1]['queries']:
+		counts = lidar[-1]
+		print(f"Lidar tested {counts['tested']/counts['queries']:.1f} segments per line, "
+			f"{100*counts['fallbacks']/counts['queries']:.0f}% of lines fell back to the whole line, "
+			f"{counts['mismatches']} mismatches")
+
+def plot(records, image_path):
+	"""
+	Saves plots of the fitness percentiles and throughput by generation
+	"""
+	import matplotlib
+	matplotlib.use('Agg')
+	import matplotlib.pyplot as plt
+
+	gens = [r['generation'] for r in records]
+	fig, (ax1, ax2) = plt.subplots(2, 1, sharex=True, figsize=(10, 8))
+	for p in PERCENTILES:
+		ax1.plot(gens, [r['fitness'][str(p)] for r in records], label=f"p{p}")
+	ax1.set_ylabel('Fitness')
+	ax1.legend()
+	ax2.plot(gens, [r['steps_per_sec'] for r in records])
+	ax2.set_ylabel('Sim steps / sec')
+	ax2.set_xlabel('Generation')
+	fig.savefig(image_path)
+
+
+if __name__ == '__main__':
+
+	if len(sys.argv) < 2:
+		print("Usage: python3 Telemetry.py <log> [plot.png] [run]")
+	else:
+		runs = list(read_runs(sys.argv[1]))
+		run = sys.argv[3] if len(sys.argv) > 3 else (runs[-1] if runs else None)
+		print(f"Run {run} of runs {', '.join(map(str, runs))}\n")
+		records = read_log(sys.argv[1], run)
+		summarise(records)
+		if len(sys.argv) > 2: plot(records, sys.argv[2])
@@ -9,33 +9,202 @@ Handles the initiation of the game for either interaction with
 a human user or the training and running of the NEAT algorithmn
 """
 
+import os
 import sys
+import time
+import csv
 import neat
 import pickle
+import multiprocessing
 from Game import *
+from Telemetry import TelemetryReporter
+from Curriculum import Curriculum
+from Checkpoint import TrainingCheckpointer, list_checkpoints, latest_checkpoint, restore_checkpoint
+from Archive import GenomeArchive
+from AutoTuner import AutoTuner
+from StartStates import StartStateBank, car_state, place_car
+from Demonstrations import DrivingRecorder, load_demonstrations, fit_policy, seed_population, policy_error, POLICY_TOLERANCE
+from Memory import MemoryReporter
 
-def NEAT_Training(genomes, config):
+# Tracks every genome is raced on as (map, spawn, heading). The spawn is either 
+# the name of a spawn object in the map or an (x,y) point, the heading is in deg
+TRAIN_TRACKS = [('assets/Map_Train.tmx', 'AISpawn', -90)]
+FITNESS_AGGREGATION = 'mean' 	# How a genome's track fitnesses are combined
+TRAIN_WORKERS = 1				# Processes racing tracks in parallel (headless if > 1)
+TRAIN_RENDER = True				# Whether single process training is drawn at 30 FPS, off while auto-tuning
+TRAIN_CAR_COLLISIONS = False	# Cars share a spawn so are kept independent by default
+TRAIN_LIDAR_MODE = 'incremental'	# LidarSensor() mode: 'full', 'incremental' or 'exact'
+TRAIN_SIMPLIFY = 0				# Pixels within which near collinear wall vertices are removed, 0 is off
+TELEMETRY_PATH = 'telemetry.log'	# Append-only log of per-generation metrics
+TELEMETRY_WINDOW = 100			# Generations of metrics kept in memory
+MEMORY_PROFILE = False			# Record memory use by subsystem in the telemetry (slows training)
+MEMORY_TOP = 10					# Largest allocation sites recorded each traced generation
+MEMORY_INTERVAL = 10			# Generations between those whose allocations are traced
+MEMORY_WINDOW = 5				# Measurements of growth before memory use is flagged
+CURRICULUM = True				# Grow the episode budget as the population improves
+CURRICULUM_START = 2			# Checkpoints allowed per episode in the first generation
+CURRICULUM_STEP = 2				# Checkpoints added each time the budget grows
+CURRICULUM_FRACTION = 0.1		# Fraction of cars that must reach the budget to grow it
+FRAMES_PER_CHECKPOINT = 150		# Frames allowed per checkpoint in the budget
+TRAIN_SEGMENTS = 0				# Track sections raced per track each generation, 0 races from the spawn
+SEGMENT_CHECKPOINTS = 3			# Checkpoints in each track section
+SEGMENT_FITNESS_FLOOR = 10		# Least a section's fitnesses are divided by, one checkpoint's reward
+START_STATES_DIR = 'start_states'	# Start states recorded from good runs, one file per map
+HUMAN_RECORD = True				# Record human driving to DEMONSTRATIONS_DIR
+DEMONSTRATIONS_DIR = 'demonstrations'	# Recordings of human driving
+SEED_FRACTION = 0.5				# Fraction of a new population fitted to the recordings, 0 is off
+SEED_NOISE = 0.2				# Stdev of the noise added to each fitted genome
+TRAIN_GENERATIONS = 1000		# Generations to train for, including resumed ones
+FITNESS_MEMO = True				# Reuse the fitness of unchanged genomes (e.g. elites)
+CHECKPOINT_PREFIX = 'neat-checkpoint-'	# Checkpoints are saved as prefix + generation
+CHECKPOINT_INTERVAL = 10		# Generations between checkpoints
+AUTO_TUNE = False				# Tune the workers, population and frame budget to the machine
+TUNE_TARGET_TIME = 30			# Seconds each generation should take when auto-tuning
+TUNE_TIME_BUDGET = None			# Seconds for the whole run, used instead if set
+TUNE_POP_SIZE = (20, 200)		# (min, max) population size when auto-tuning
+TUNE_FRAMES_PER_CHECKPOINT = (100, 300)	# (min, max) frames per checkpoint when auto-tuning
+TUNE_MAX_WORKERS = multiprocessing.cpu_count()	# Max workers when auto-tuning
+ARCHIVE_DIR = 'archive'			# Columnar archive of every evaluated genome, one directory per run
+HALL_OF_FAME = 'hall_of_fame'	# Directory of pickled genomes raced in a tournament
+TOURNAMENT_MAP = 'assets/Map_Run.tmx'	# Default track of a tournament
+TOURNAMENT_SPAWN = None			# Spawn object name or (x,y) point, None uses the map's AI spawn
+TOURNAMENT_HEADING = -90		# Initial heading (deg) of the cars in a tournament
+RUN_LIDAR_MODE = 'full'			# LidarSensor() mode of saved controllers when run or raced
+TOURNAMENT_FRAMES = 20000		# Frames before a tournament is stopped
+TOURNAMENT_RESULTS = 'tournament.csv'	# Ranking written by a tournament
+
+AGGREGATIONS = {'mean': lambda f: sum(f)/len(f), 'min': min}
+
+tracks = {}		# Loaded Game for each map path, reused every generation
+pool = None		# Worker processes used when more than 1 worker is used
+tuner = None	# AutoTuner() when AUTO_TUNE is set
+networks = {}	# Compiled network for each genome id
+fitness_memo = {}	# (genome id, evaluation settings): (raw fitness of each race, episode length, progress)
+banks = {}		# StartStateBank() of each map raced in sections
+lidar_counts = {}	# Query counters of the training cars' LidarSensor()'s in this process
+curriculum = None
+if CURRICULUM:
+	curriculum = Curriculum(CURRICULUM_START, CURRICULUM_STEP, 
+		CURRICULUM_FRACTION, FRAMES_PER_CHECKPOINT)
+
+def load_track(map_path, lidar_mode=TRAIN_LIDAR_MODE):
 	"""
-	Executes the NEAT training algoithmn
+	Returns a reset Game for the map. Each map is only loaded the first time
+	it is requested by this process.
+	@param string lidar_mode: LidarSensor() mode of the cars the Game creates
 	"""
-		
-	# Initalise Game
-	game = Game(train=True, Human=False)
+	if map_path not in tracks:
+		tracks[map_path] = Game(train=True, Human=False, map_path=map_path, 
+			car_collisions=TRAIN_CAR_COLLISIONS, lidar_mode=TRAIN_LIDAR_MODE, simplify=TRAIN_SIMPLIFY)
+	game = tracks[map_path]
+	game.reset()
+	game.lidar_mode = lidar_mode
+	return game
+
+def get_bank(map_path):
+	"""
+	Returns the start state bank of the map, loading its recorded states the 
+	first time it is requested
+	"""
+	if map_path not in banks:
+		banks[map_path] = StartStateBank(load_track(map_path).checkpoints)
+		filename = get_states_path(map_path)
+		if os.path.exists(filename): banks[map_path].load(filename)
+	return banks[map_path]
+
+def get_states_path(map_path):
+	"""
+	Returns the file the start states of the map are recorded in
+	"""
+	name = os.path.splitext(os.path.basename(map_path))[0]
+	return os.path.join(START_STATES_DIR, f"{name}.npz")
+
+def get_network(id, genome, config):
+	"""
+	Returns the compiled network of the genome, only creating it the first time
+	"""
+	if id not in networks:
+		networks[id] = neat.nn.FeedForwardNetwork.create(genome, config)
+	return networks[id]
+
+def worker_pids():
+	"""
+	Returns the process ids of the training workers
+	"""
+	if pool is None: return []
+	return [process.pid for process in pool._pool]
+
+def cache_sizes():
+	"""
+	Returns the number of entries in each training cache
+	"""
+	return {'tracks': len(tracks), 'networks': len(networks), 
+		'fitness_memo': len(fitness_memo), 'banks': len(banks)}
+
+def surface_sizes():
+	"""
+	Returns the bytes of the map and car surfaces of the loaded tracks
+	"""
+	maps = {id(game.map_img): game.map_img for game in tracks.values()}
+	cars = {id(image): image for game in tracks.values() for car in game.AIs 
+		for image in (car.image, car.image_copy)}
+	return {'map': sum([s.get_pitch()*s.get_height() for s in maps.values()]),
+		'sprites': sum([s.get_pitch()*s.get_height() for s in cars.values()])}
+
+def lidar_report():
+	"""
+	Returns the lidar query counters of the cars raced by this process so far
+	"""
+	return dict(lidar_counts)
+
+def init_worker():
+	"""
+	Runs pygame without a window inside the training worker processes
+	"""
+	os.environ['SDL_VIDEODRIVER'] = 'dummy'
+
+def evaluate_track(nets, track, render=False, budget=(None, None), events=None, start=None,
+	lidar_mode=TRAIN_LIDAR_MODE):
+	"""
+	Races all genomes at once as cars on a single track
+	@param list nets: Compiled network of each genome
+	@param tuple track: (map, spawn, heading) as in TRAIN_TRACKS
+	@param bool render: Draw the race and limit it to 30 FPS
+	@param tuple budget: Max (checkpoints, frames) of the episode. None is unlimited
+	@param list events: If given, filled with a dict for each car holding the
+		frame each checkpoint was passed ('splits'), its state as it passed them
+		('states') and where it crashed ('crash')
+	@param tuple start: StartStateBank() state the cars start from instead of the spawn
+	@param string lidar_mode: LidarSensor() mode of the cars
+	@return list: Fitness of each genome on the track
+	@return list: Number of frames each genome's car was simulated for
+	@return list: Number of checkpoints each genome's car passed
+	"""
+	map_path, spawn, heading = track
+	game = load_track(map_path, lidar_mode)
+	max_checkpoints, max_frames = budget
+	lap_checkpoints = NUM_LAPS*len(game.checkpoints)
+	if max_checkpoints == None or max_checkpoints > lap_checkpoints:
+		max_checkpoints = lap_checkpoints
 
 	# Initalise Genome Variables
-	nets, cars = [], []
-	for id, g in genomes:
-		cars.append(game.create_AI())
-		net = neat.nn.FeedForwardNetwork.create(g, config)
-		nets.append(net)
-		g.fitness = 0
+	if start is None:
+		cars = [game.create_AI(spawn, heading) for net in nets]
+	else:
+		cars = [game.create_AI(start[1], start[2]) for net in nets]
+		for car in cars: place_car(car, start)
+	first_checkpoint = cars[0].checkpoints_passed
+	fitnesses = [0]*len(cars)
+	lengths = [0]*len(cars)
+	if events != None:
+		events.extend([{'splits': [], 'states': [], 'crash': None} for car in cars])
 	game.set_focus_car(cars[0])
 
 	# Main Game Loop
 	count = 0
 	game.AIs[0].update()
 	while game.running:
-		game.clock.tick(30)	
+		if render: game.clock.tick(30)	
 		game.process_events()
 		game.camera_offset = game.camera.update(game.AIs[0])
 		for index, car in enumerate(cars):
@@ -55,8 +224,10 @@ def NEAT_Training(genomes, config):
 					elif key == "InnerWall": # If outside the innerwall
 						insideInnerWall = line.inside_polygon(car.rect.center)
 				offRoad = insideOuterWall == insideInnerWall	
-				if offRoad and count>1: car.kill()
-				if car.laps_done() == 2: car.kill()
+				if offRoad and count>1: 
+					car.kill()
+					if events != None: events[index]['crash'] = tuple(car.rect.center)
+				if car.checkpoints_passed - first_checkpoint >= max_checkpoints: car.kill()
 
 		# Update cars and assess fitness
 		remain_cars = 0
@@ -65,26 +236,203 @@ def NEAT_Training(genomes, config):
 			if car.is_alive():
 				remain_cars += 1
 				car.update()
-				genomes[i][1].fitness += car.get_reward()
-				fitness = genomes[i][1].fitness
-				if fitness > max_fitness*1.2:
+				lengths[i] += 1
+				fitnesses[i] += car.get_reward()
+				if fitnesses[i] > max_fitness*1.2:
 					game.focus_car = car
-					max_fitness = fitness
+					max_fitness = fitnesses[i]
 		if remain_cars == 0: break
+		if max_frames != None and count >= max_frames: break
 
 		game.update()
-		game.draw()
+		if render: game.draw()
 		count += 1
-	pg.quit()
+		if events != None:
+			for i, car in enumerate(cars):
+				splits = events[i]['splits']
+				if len(splits) < car.checkpoints_passed - first_checkpoint:
+					events[i]['states'].append(car_state(car))
+				while len(splits) < car.checkpoints_passed - first_checkpoint: splits.append(count)
+
+	# Count the lidar queries of the race
+	counts = {}
+	for car in cars:
+		for name, value in car.lidar.counts().items():
+			counts[name] = counts.get(name, 0) + value
+			lidar_counts[name] = lidar_counts.get(name, 0) + value
+	if counts.get('mismatches'):
+		print(f" Warning: {counts['mismatches']} incremental lidar distances differed from the full query")
+	return fitnesses, lengths, [car.checkpoints_passed - first_checkpoint for car in cars]
+
+def NEAT_Training(genomes, config):
+	"""
+	Executes the NEAT training algoithmn. Every genome is raced on each of 
+	TRAIN_TRACKS and its fitness is the FITNESS_AGGREGATION of the results.
+	With TRAIN_SEGMENTS set, genomes are instead raced on sections of each track
+	sampled from its start state bank, and their fitness on each section is 
+	divided by the best fitness of the population on that section so that hard
+	and easy sections count equally.
+	Genomes already raced with the same settings reuse their memoised results.
+	"""
+	global pool
+	workers = TRAIN_WORKERS
+	if tuner is not None: workers = tuner.workers
+	budget = (None, None)
+	races = [(track, None) for track in TRAIN_TRACKS]
+	if TRAIN_SEGMENTS:
+		frames = FRAMES_PER_CHECKPOINT
+		if curriculum is not None: frames = curriculum.frames_per_checkpoint
+		budget = (SEGMENT_CHECKPOINTS, SEGMENT_CHECKPOINTS*frames)
+		races = [(track, start) for track in TRAIN_TRACKS 
+			for start in get_bank(track[0]).sample(TRAIN_SEGMENTS)]
+		print(f" Racing sections from checkpoints {[start[0] for track, start in races]}")
+	elif curriculum is not None:
+		budget = curriculum.budget()
+		print(f" Episode budget: {budget[0]} checkpoints, {budget[1]} frames")
+	settings = (budget, tuple(races), FITNESS_AGGREGATION)
+	to_race = genomes
+	if FITNESS_MEMO:
+		to_race = [(id, g) for id, g in genomes if (id, settings) not in fitness_memo]
+
+	nets = [get_network(id, g, config) for id, g in to_race]
+	if len(to_race) == 0:
+		results = []
+	elif workers > 1:
+		if pool is not None and pool._processes != workers:
+			pool.close()
+			pool = None
+		if pool is None:
+			pool = multiprocessing.Pool(workers, initializer=init_worker)
+		results = pool.starmap(evaluate_track, 
+			[(nets, track, False, budget, None, start) for track, start in races])
+	else:
+		# Drawing limits races to 30 FPS, which would hide the machine's speed from the tuner
+		render = TRAIN_RENDER and tuner is None
+		results = [evaluate_track(nets, track, render, budget, start=start) 
+			for track, start in races]
+
+	# Memoise the raw fitness of each race
+	for i, (id, g) in enumerate(to_race):
+		length = sum([lengths[i] for fitnesses, lengths, progress in results])
+		fitness_memo[(id, settings)] = ([f[i] for f, l, p in results], length, [p[i] for f, l, p in results])
+
+	# Normalise section fitnesses over the whole population and update where cars fail
+	scales = [1]*len(races)
+	if TRAIN_SEGMENTS:
+		race_fitnesses = zip(*[fitness_memo[(id, settings)][0] for id, g in genomes])
+		scales = [max(max(fitnesses), SEGMENT_FITNESS_FLOOR) for fitnesses in race_fitnesses]
+		race_progress = zip(*[fitness_memo[(id, settings)][2] for id, g in genomes])
+		for (track, start), progress in zip(races, race_progress):
+			get_bank(track[0]).update(start, progress, SEGMENT_CHECKPOINTS)
+
+	# Combine the results from each track
+	aggregate = AGGREGATIONS[FITNESS_AGGREGATION]
+	raced = set([id for id, g in to_race])
+	for id, g in genomes:
+		fitnesses, g.episode_length, progress = fitness_memo[(id, settings)]
+		g.fitness = aggregate([f/scale for f, scale in zip(fitnesses, scales)])
+		g.frames_simulated = g.episode_length if id in raced else 0
+	if curriculum is not None and not TRAIN_SEGMENTS:
+		curriculum.update([p for id, g in genomes for p in fitness_memo[(id, settings)][2]])
+
+	# Forget genomes that are no longer in the population
+	ids = set([id for id, g in genomes])
+	for key in [key for key in fitness_memo if key[0] not in ids or key[1] != settings]: del fitness_memo[key]
+	for id in [id for id in networks if id not in ids]: del networks[id]
 	return min([g.fitness for id, g in genomes])
 
+def NEAT_Tournament(config, directory=HALL_OF_FAME, map_path=TOURNAMENT_MAP, 
+	spawn=TOURNAMENT_SPAWN, heading=TOURNAMENT_HEADING):
+	"""
+	Races every genome saved in the directory at once on the track without a
+	window and ranks them by progress and then finishing time. The cars use
+	the same lidar as NEAT_Run.
+	@param spawn: Name of a spawn object in the map, an (x,y) point or None for
+		the map's AI spawn
+	@param int heading: Initial heading of the cars (deg)
+	"""
+	os.environ['SDL_VIDEODRIVER'] = 'dummy'
+	if not os.path.isdir(directory):
+		print(f"{directory} is not a directory, save the genomes to race in it")
+		return
+
+	# Check the Spawn
+	game = load_track(map_path, RUN_LIDAR_MODE)
+	if spawn is None and game.AI_spawn is None:
+		print(f"{map_path} has no AI spawn object, give a spawn point instead")
+		return
+	if isinstance(spawn, str) and spawn not in game.spawn_points:
+		print(f"{map_path} has no spawn named {spawn}, it has {sorted(game.spawn_points)}")
+		return
+
+	# Load the Controllers
+	names, nets = [], []
+	for name in sorted(os.listdir(directory)):
+		try:
+			with open(os.path.join(directory, name), 'rb') as f:
+				genome = pickle.load(f)
+		except Exception as e:
+			print(f"Skipping {name}: {e}")
+			continue
+		names.append(name)
+		nets.append(neat.nn.FeedForwardNetwork.create(genome, config))
+	if len(nets) == 0:
+		print(f"No controllers found in {directory}")
+		return
+
+	# Race all Controllers
+	events = []
+	fitnesses, lengths, progress = evaluate_track(nets, (map_path, spawn, heading), 
+		budget=(None, TOURNAMENT_FRAMES), events=events, lidar_mode=RUN_LIDAR_MODE)
+	num_checkpoints = len(tracks[map_path].checkpoints)
+
+	# Rank by checkpoints passed, then by the frame the last one was passed
+	ranking = sorted(range(len(names)), key=lambda i: (-progress[i], 
+		events[i]['splits'][-1] if progress[i] else 0))
+	with open(TOURNAMENT_RESULTS, 'w', newline='') as f:
+		writer = csv.writer(f)
+		writer.writerow(['rank', 'controller', 'checkpoints', 'lap_times', 'crash', 'splits'])
+		print(f"{'rank':>4}  {'controller':<24} {'checkpoints':>11}  {'lap times (s)':<20} crash")
+		for rank, i in enumerate(ranking):
+			laps = events[i]['splits'][num_checkpoints-1::num_checkpoints]
+			lap_times = [round((end-start)/60, 2) for start, end in zip([0]+laps, laps)]
+			splits = [round(frame/60, 2) for frame in events[i]['splits']]
+			crash = events[i]['crash']
+			writer.writerow([rank+1, names[i], progress[i], lap_times, crash, splits])
+			print(f"{rank+1:>4}  {names[i]:<24} {progress[i]:>11}  {str(lap_times):<20} "
+				f"{crash if crash else '-'}")
+	print(f"\nRanking saved to {TOURNAMENT_RESULTS}")
+	pg.quit()
+
+def NEAT_Record_States(config, genome_path='winner'):
+	"""
+	Drives a saved genome around each of TRAIN_TRACKS without a window and saves 
+	its state as it passes each checkpoint to the map's start state bank
+	"""
+	os.environ['SDL_VIDEODRIVER'] = 'dummy'
+	with open(genome_path, 'rb') as f:
+		net = neat.nn.FeedForwardNetwork.create(pickle.load(f), config)
+	os.makedirs(START_STATES_DIR, exist_ok=True)
+	for track in TRAIN_TRACKS:
+		map_path = track[0]
+		checkpoints = len(load_track(map_path).checkpoints)
+		events = []
+		evaluate_track([net], track, budget=(None, NUM_LAPS*checkpoints*FRAMES_PER_CHECKPOINT), 
+			events=events)
+		bank = StartStateBank(load_track(map_path).checkpoints)
+		for state in events[0]['states']: bank.record(state)
+		bank.save(get_states_path(map_path))
+		print(f"Recorded {len(events[0]['states'])} start states on {map_path} "
+			f"to {get_states_path(map_path)}")
+	pg.quit()
+
 def NEAT_Run(config):
 	"""
 	Runs the best stored NEAT implementation
 	"""
 
 	# Initalise Game
-	game = Game(lidar=True, Human=False)
+	game = Game(lidar=True, Human=False, lidar_mode=RUN_LIDAR_MODE)
 
 	# Load the Winner
 	with open('winner', 'rb') as f:
@@ -135,27 +483,95 @@ if __name__ == '__main__':
 			game = Game(AI=False)
 			car = game.create_Human()
 			game.set_focus_car(car)
-			game.run()
+			recorder = DrivingRecorder(car, game.geometry.walls, TRAIN_LIDAR_MODE) if HUMAN_RECORD else None
+			game.run(recorder)
+			if recorder != None:
+				filename = recorder.save(DEMONSTRATIONS_DIR)
+				if filename != None: print(f"Recorded {len(recorder.steering)} frames to {filename}")
 	else:
 		config_path = "./config"
 		config = neat.config.Config(neat.DefaultGenome, neat.DefaultReproduction,
 						neat.DefaultSpeciesSet, neat.DefaultStagnation, config_path)
-		if 'train' in arg:
-			# Load Configuration Files
-			p = neat.Population(config)
-			p.add_reporter(neat.StdOutReporter(True))
-			stats = neat.StatisticsReporter()
+		if 'train' in arg or 'resume' in arg:
+			checkpoint = None
+			if 'resume' in arg: checkpoint = latest_checkpoint(CHECKPOINT_PREFIX)
+			elif len(list_checkpoints(CHECKPOINT_PREFIX)):
+				print(f"Checkpoints from an earlier run exist ({CHECKPOINT_PREFIX}*). Continue "
+					"it with 'resume', or move or delete them to start a new run.")
+				sys.exit(1)
+			if checkpoint is None:
+				# Load Configuration Files
+				run_id = time.strftime('%Y%m%d-%H%M%S')
+				p = neat.Population(config)
+				if SEED_FRACTION > 0:
+					inputs, targets = load_demonstrations(DEMONSTRATIONS_DIR)
+					if len(inputs):
+						weights, biases = fit_policy(inputs, targets)
+						error = policy_error(config, inputs, weights, biases)
+						if error > POLICY_TOLERANCE:
+							print(f"Warning: seeded networks differ from the fit by up to {error:.2g}")
+						seeded = seed_population(p, config, weights, biases, SEED_FRACTION, SEED_NOISE)
+						print(f"Seeded {seeded} genomes from {len(inputs)} recorded frames")
+				p.add_reporter(neat.StdOutReporter(True))
+				sources = {}
+				if curriculum is not None and not TRAIN_SEGMENTS: sources['budget'] = curriculum.report
+				if TRAIN_LIDAR_MODE != 'full': sources['lidar'] = lidar_report
+				if AUTO_TUNE:
+					tuner = AutoTuner(TUNE_TARGET_TIME, TUNE_TIME_BUDGET, TRAIN_GENERATIONS, 
+						TUNE_POP_SIZE, TUNE_FRAMES_PER_CHECKPOINT, 
+						(TRAIN_WORKERS, max(TRAIN_WORKERS, min(TUNE_MAX_WORKERS, len(TRAIN_TRACKS)*max(TRAIN_SEGMENTS, 1)))),
+						curriculum)
+
+				# Checkpoints are saved before the timing and memory reporters start the generation
+				p.add_reporter(TrainingCheckpointer(p, CHECKPOINT_PREFIX, CHECKPOINT_INTERVAL, 
+					state={'curriculum': curriculum, 'fitness_memo': fitness_memo, 
+						'networks': networks, 'tuner': tuner, 'banks': banks}))
+				if tuner is not None:
+					p.add_reporter(tuner)
+					sources['tuner'] = tuner.report
+				if MEMORY_PROFILE:
+					memory = MemoryReporter(MEMORY_TOP, MEMORY_WINDOW, pids=worker_pids, 
+						counters=cache_sizes, surfaces=surface_sizes, interval=MEMORY_INTERVAL)
+					p.add_reporter(memory)
+					sources['memory'] = memory.report
+				p.add_reporter(TelemetryReporter(TELEMETRY_PATH, TELEMETRY_WINDOW, sources, run_id))
+				p.add_reporter(GenomeArchive(os.path.join(ARCHIVE_DIR, run_id)))
+			else:
+				# Continue from the saved population, reporters and caches
+				print(f"Resuming from {checkpoint}")
+				p, state = restore_checkpoint(checkpoint)
+				curriculum = state['curriculum']
+				fitness_memo = state['fitness_memo']
+				networks = state['networks']
+				tuner = state['tuner']
+				banks = state['banks']
 			
 			# Train Cars with NEAT
-			p.add_reporter(stats)
-			winner = p.run(NEAT_Training, 1000)
+			winner = p.run(NEAT_Training, TRAIN_GENERATIONS - p.generation)
+			for reporter in p.reporters.reporters:
+				if isinstance(reporter, GenomeArchive): reporter.flush()
+			if pool is not None: pool.close()
+			pg.quit()
 
 			# Save the Winner
 			with open('winner-test', 'wb') as f:
 				pickle.dump(winner, f)
 			print(winner)
+
+			# The run has finished, so it can no longer be resumed
+			for reporter in p.reporters.reporters:
+				if isinstance(reporter, TrainingCheckpointer): reporter.remove_checkpoints()
 		elif 'robot' in arg:
 			NEAT_Run(config)
+		elif 'tournament' in arg:
+			args = sys.argv[2:4]
+			if len(sys.argv) > 4:
+				spawn = sys.argv[4]
+				if ',' in spawn: spawn = tuple([float(v) for v in spawn.split(',')])
+				args = [*args, spawn] + [float(h) for h in sys.argv[5:6]]
+			NEAT_Tournament(config, *args)
+		elif 'states' in arg:
+			NEAT_Record_States(config, *sys.argv[2:3])
 		else:
-			print("Please enter 'human, train or robot' as a valid arg.")
+			print("Please enter 'human, train, resume, robot, tournament or states' as a valid arg.")
 